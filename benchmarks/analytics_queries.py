@@ -0,0 +1,89 @@
+"""
+Бенчмарк запросов аналитики на сгенерированной БД (по умолчанию 1 млн событий).
+
+    python -m benchmarks.analytics_queries
+    python -m benchmarks.analytics_queries --events 200000 --users 50000 --db /tmp/stats_bench.db
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from services import analytics_db
+from services.storage import Database
+
+ACTIONS = ("stt", "stt", "stt", "stt", "purchase", "violation", "start")
+
+def generate(events, users, days):
+    started = datetime.utcnow() - timedelta(days=days)
+    span = days * 86400
+    user_rows = [
+        (str(100000 + i), 0, 0, started.isoformat(), started.isoformat(), None)
+        for i in range(users)
+    ]
+    with analytics_db.get_conn() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, stt_count, recognitions_purchased, registered_at, last_active, source) VALUES (?, ?, ?, ?, ?, ?)",
+            user_rows
+        )
+    # События пишутся тем же путём, что и в боте (буфер -> _apply_buffer), пачками по 10 тысяч
+    offsets = sorted(random.random() * span for _ in range(events))
+    batch = []
+    apply_seconds = 0.0
+    for offset in offsets:
+        timestamp = (started + timedelta(seconds=offset)).isoformat()
+        batch.append((str(100000 + random.randrange(users)), random.choice(ACTIONS), timestamp, None))
+        if len(batch) == 10000:
+            t = time.perf_counter()
+            analytics_db._apply_buffer(batch, {}, {})
+            apply_seconds += time.perf_counter() - t
+            batch = []
+    if batch:
+        analytics_db._apply_buffer(batch, {}, {})
+    return apply_seconds
+
+def measure(name, func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t)
+    print(f"{name:<42} {best * 1000:9.2f} мс")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов аналитики")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--db", help="файл БД (по умолчанию временный)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "stats_bench.db")
+    analytics_db.db = Database(path)
+    analytics_db.init_db()
+    if analytics_db.get_stats().get("total_users", 0) == 0 and not analytics_db.get_users_page(limit=1)[0]:
+        t = time.perf_counter()
+        apply_seconds = generate(args.events, args.users, args.days)
+        print(f"Сгенерировано {args.events} событий за {time.perf_counter() - t:.1f} с "
+              f"(запись с обновлением сводок: {args.events / apply_seconds:.0f} событий/с)")
+
+    since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    measure("get_stats", analytics_db.get_stats)
+    measure("get_users_page (1000)", lambda: analytics_db.get_users_page(limit=1000))
+    measure("get_users_page (курсор в середине)", lambda: analytics_db.get_users_page(str(100000 + args.users // 2)))
+    measure("iter_users (все)", lambda: sum(1 for _ in analytics_db.iter_users(5000)), repeat=1)
+    measure("get_events(action='purchase')", lambda: analytics_db.get_events(action="purchase"))
+    measure("get_events(since=сутки)", lambda: analytics_db.get_events(since=since))
+    measure("get_events(action='violation', since)", lambda: analytics_db.get_events(action="violation", since=since))
+    measure("get_events(user_id)", lambda: analytics_db.get_events(user_id=100042))
+    measure("get_rollup('day')", lambda: analytics_db.get_rollup("day"))
+    measure("get_rollup('hour', since=сутки)", lambda: analytics_db.get_rollup("hour", since=since))
+    with analytics_db.get_conn() as conn:
+        measure("COUNT по действиям (без сводок)", lambda: conn.execute(
+            "SELECT action, COUNT(*) FROM events GROUP BY action").fetchall(), repeat=1)
+    print(f"БД: {path} ({os.path.getsize(path) / 1024 / 1024:.0f} МБ)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Интеграционная проверка брокера задач (TTS_BACKEND=broker): N процессов-воркеров
+разбирают общую очередь во временной БД, а скрипт проверяет, что каждая задача
+выполнена ровно один раз и с результатом именно для своего текста.
+
+Проверяется и возврат задач по истечении аренды: один воркер убивается (SIGKILL),
+пока держит задачу, а ещё один «зависает» дольше job_timeout и пытается сдать
+результат уже после того, как задачу забрал другой, — такой результат должен
+быть отклонён.
+
+По умолчанию воркеры повторяют цикл run_worker из worker.py с имитацией синтеза
+(без torch) и пишут журнал сданных результатов — по нему считаются повторы.
+С --real запускаются настоящие воркеры (python worker.py), проверка — по БД.
+
+    python -m benchmarks.broker_integration
+    python -m benchmarks.broker_integration --workers 8 --jobs 2000 --job-timeout 1
+    python -m benchmarks.broker_integration --real --workers 2 --jobs 40 --job-timeout 20
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from services.job_broker import JobBroker
+
+REAL_TEXTS = [
+    "Привет, как дела?",
+    "Сегодня хорошая погода для прогулки.",
+    "Съешь же ещё этих мягких французских булок, да выпей чаю.",
+]
+
+def payload(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+def fake_worker(path, job_timeout, max_attempts, log_path, work_ms, zombie):
+    """Цикл run_worker без синтеза; zombie — берёт одну задачу и сдаёт её после истечения аренды."""
+    broker = JobBroker(path, job_timeout=job_timeout, max_attempts=max_attempts)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = False
+
+    def request_stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    last_requeue = 0.0
+    with open(log_path, "a", encoding="utf-8", buffering=1) as log:
+        while not stopping:
+            try:
+                if time.monotonic() - last_requeue > job_timeout / 4:
+                    last_requeue = time.monotonic()
+                    broker.requeue_expired()
+                job = broker.claim(worker_id)
+            except sqlite3.OperationalError:
+                time.sleep(0.01)
+                continue
+            if job is None:
+                time.sleep(0.01)
+                continue
+            job_id, _, text = job
+            time.sleep(job_timeout * 1.5 if zombie else work_ms / 1000)
+            accepted = broker.complete(job_id, worker_id, data=payload(text))
+            log.write(f"{job_id} {worker_id} {int(accepted)}\n")
+            if zombie:
+                break
+    broker.db.close()
+
+def read_logs(directory):
+    accepted, rejected = Counter(), Counter()
+    for name in os.listdir(directory):
+        if not name.endswith(".log"):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            for line in f:
+                job_id, _, ok = line.split()
+                (accepted if ok == "1" else rejected)[int(job_id)] += 1
+    return accepted, rejected
+
+def held_job(broker, worker_id):
+    with broker.db.transaction() as conn:
+        row = conn.execute(
+            "SELECT id FROM tts_jobs WHERE status='running' AND worker=? LIMIT 1", (worker_id,)
+        ).fetchone()
+    return row[0] if row else None
+
+def start_workers(args, directory, path):
+    processes = []
+    if args.real:
+        env = dict(os.environ, TTS_BROKER_DB=path, TTS_BROKER_JOB_TIMEOUT=str(args.job_timeout),
+                   TTS_BROKER_MAX_ATTEMPTS=str(args.max_attempts))
+        for _ in range(args.workers):
+            processes.append(subprocess.Popen([sys.executable, "worker.py", "--langs", "ru"], env=env))
+        return processes
+    ctx = multiprocessing.get_context("spawn")
+    for index in range(args.workers + 1):
+        zombie = index == args.workers
+        log_path = os.path.join(directory, f"worker{index}.log")
+        process = ctx.Process(
+            target=fake_worker,
+            args=(path, args.job_timeout, args.max_attempts, log_path, args.work_ms, zombie),
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+def stop_workers(processes):
+    for process in processes:
+        if isinstance(process, subprocess.Popen):
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+        else:
+            process.terminate()
+            process.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Интеграционная проверка брокера задач синтеза")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--job-timeout", type=float, default=2.0, help="аренда задачи, с")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--work-ms", type=float, default=5, help="имитация синтеза одной задачи, мс")
+    parser.add_argument("--timeout", type=float, default=120, help="общий лимит ожидания, с")
+    parser.add_argument("--real", action="store_true", help="настоящие воркеры worker.py (нужен torch)")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="broker_")
+    path = os.path.join(directory, "tts_jobs.db")
+    broker = JobBroker(path, job_timeout=args.job_timeout, max_attempts=args.max_attempts)
+    broker.init()
+    texts = {}
+    for i in range(args.jobs):
+        text = REAL_TEXTS[i % len(REAL_TEXTS)] if args.real else f"задача {i}"
+        texts[broker.submit("ru", "aidar", text)] = text
+
+    started = time.perf_counter()
+    processes = start_workers(args, directory, path)
+    victim = processes[0]
+    victim_id = f"{socket.gethostname()}:{victim.pid}"
+    killed_job = None
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        if killed_job is None:
+            killed_job = held_job(broker, victim_id)
+            if killed_job is not None:
+                os.kill(victim.pid, signal.SIGKILL)
+        # Как и BrokerClient бота: сам возвращает просроченные задачи в очередь
+        broker.requeue_expired()
+        stats = broker.stats()
+        if not stats.get("queued") and not stats.get("running"):
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    stop_workers(processes)
+
+    with broker.db.transaction() as conn:
+        rows = conn.execute("SELECT id, status, attempts, result_data, result_path FROM tts_jobs").fetchall()
+    errors = []
+    retried = []
+    for job_id, status, attempts, data, result_path in rows:
+        if status != "done":
+            errors.append(f"задача {job_id}: статус {status}")
+        elif args.real and not (data or result_path):
+            errors.append(f"задача {job_id}: нет результата")
+        elif not args.real and data != payload(texts[job_id]):
+            errors.append(f"задача {job_id}: чужой результат")
+        if attempts > 1:
+            retried.append(job_id)
+    if killed_job is None:
+        errors.append("убитый воркер не успел взять задачу")
+    elif killed_job not in retried:
+        errors.append(f"задача {killed_job} убитого воркера не вернулась в очередь")
+
+    print(f"Задач: {len(rows)}, воркеров: {args.workers}, за {elapsed:.1f} с ({len(rows) / elapsed:.0f} задач/с)")
+    print(f"Возвращено в очередь по аренде: {len(retried)} (задача убитого воркера: {killed_job})")
+    if not args.real:
+        accepted, rejected = read_logs(directory)
+        for job_id in texts:
+            if accepted[job_id] != 1:
+                errors.append(f"задача {job_id}: принято результатов {accepted[job_id]}")
+        if not rejected:
+            errors.append("поздний результат зависшего воркера не был отклонён")
+        print(f"Отклонено поздних результатов: {sum(rejected.values())}, повторных выполнений: "
+              f"{sum(accepted.values()) + sum(rejected.values()) - len(texts)}")
+    for error in errors[:20]:
+        print(error, file=sys.stderr)
+    print(f"Ошибок: {len(errors)}")
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
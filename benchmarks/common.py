@@ -0,0 +1,42 @@
+import platform
+import resource
+import subprocess
+import sys
+
+def percentile(values, q):
+    """Перцентиль q (0..1) по отсортированному списку."""
+    if not values:
+        return 0.0
+    index = min(int(len(values) * q), len(values) - 1)
+    return values[index]
+
+def summarize(values, scale=1000):
+    """p50/p90/p99/max/mean в миллисекундах (scale=1000) для списка секунд."""
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "p50": percentile(values, 0.5) * scale,
+        "p90": percentile(values, 0.9) * scale,
+        "p99": percentile(values, 0.99) * scale,
+        "max": values[-1] * scale,
+        "mean": sum(values) / len(values) * scale,
+    }
+
+def peak_rss_mb():
+    # ru_maxrss на Linux в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def environment():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "revision": revision,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
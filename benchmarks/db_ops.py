@@ -0,0 +1,140 @@
+"""
+Микробенчмарк слоя БД: операций в секунду для add_used, can_speak и increment_stt
+до (новое соединение sqlite3 и коммит на каждый вызов, как в исходной версии) и после
+(долгоживущее WAL-соединение services.storage, кэш user_limits и буфер аналитики).
+
+    python -m benchmarks.db_ops
+    python -m benchmarks.db_ops --ops 20000 --users 1000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from services import analytics_db, user_limits_db
+from services.storage import Database
+
+class Baseline:
+    """Исходный доступ к БД: каждая функция открывает своё соединение и коммитит."""
+
+    def __init__(self, limits_path, stats_path):
+        self.limits_path = limits_path
+        self.stats_path = stats_path
+
+    def _call(self, path, func):
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                return func(conn)
+        finally:
+            conn.close()
+
+    def _ensure_user(self, conn, user_id):
+        if not conn.execute("SELECT 1 FROM user_limits WHERE user_id=?", (user_id,)).fetchone():
+            conn.execute(
+                "INSERT INTO user_limits (user_id, used, purchased, cumulative, last_request, last_used, registered_at, free_limit, frozen) VALUES (?, 0, 0, 0, NULL, NULL, ?, ?, 0)",
+                (user_id, datetime.utcnow().isoformat(), user_limits_db.FREE_LIMIT)
+            )
+
+    def add_used(self, user_id):
+        def run(conn):
+            now = datetime.utcnow().isoformat()
+            self._ensure_user(conn, str(user_id))
+            conn.execute(
+                "UPDATE user_limits SET used = used + 1, cumulative = cumulative + 1, last_used=? WHERE user_id=?",
+                (now, str(user_id))
+            )
+            conn.execute(
+                "INSERT INTO user_limit_history (user_id, action, amount, timestamp, comment) VALUES (?, 'use', 1, ?, NULL)",
+                (str(user_id), now)
+            )
+        self._call(self.limits_path, run)
+
+    def can_speak(self, user_id):
+        def run(conn):
+            row = conn.execute(
+                "SELECT used, purchased, free_limit, frozen FROM user_limits WHERE user_id=?", (str(user_id),)
+            ).fetchone()
+            if row is None:
+                self._ensure_user(conn, str(user_id))
+                return True
+            used, purchased, free_limit, frozen = row
+            return not frozen and used + 1 <= free_limit + purchased
+        return self._call(self.limits_path, run)
+
+    def increment_stt(self, user_id):
+        s_id = str(user_id)
+        now = datetime.utcnow().isoformat()
+
+        def register(conn):
+            if not conn.execute("SELECT 1 FROM users WHERE user_id=?", (s_id,)).fetchone():
+                conn.execute(
+                    "INSERT INTO users (user_id, stt_count, recognitions_purchased, registered_at, last_active, source) VALUES (?, 0, 0, ?, ?, NULL)",
+                    (s_id, now, now)
+                )
+                conn.execute("UPDATE stats SET value = value + 1 WHERE key='total_users'")
+
+        def increment(conn):
+            conn.execute("UPDATE stats SET value = value + 1 WHERE key='total_stt'")
+            conn.execute("UPDATE users SET stt_count = stt_count + 1, last_active=? WHERE user_id=?", (now, s_id))
+            conn.execute("INSERT INTO events (user_id, action, timestamp, details) VALUES (?, 'stt', ?, NULL)", (s_id, now))
+
+        self._call(self.stats_path, register)
+        self._call(self.stats_path, increment)
+
+def prepare(directory, name, journal_mode):
+    """Создаёт обе БД текущими init_db и переключает режим журнала."""
+    limits_path = os.path.join(directory, f"{name}_limits.db")
+    stats_path = os.path.join(directory, f"{name}_stats.db")
+    user_limits_db.db = Database(limits_path)
+    analytics_db.db = Database(stats_path)
+    analytics_db.event_buffer.journal_path = os.path.join(directory, f"{name}_stats.journal")
+    user_limits_db.init_db()
+    analytics_db.init_db()
+    for database in (user_limits_db.db, analytics_db.db):
+        with database.transaction() as conn:
+            conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        database.close()
+    return limits_path, stats_path
+
+def measure(func, user_ids, finish=None):
+    started = time.perf_counter()
+    for user_id in user_ids:
+        func(user_id)
+    if finish:
+        finish()
+    return len(user_ids) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Операций в секунду для слоя БД до и после")
+    parser.add_argument("--ops", type=int, default=5000, help="вызовов каждой функции")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--dir", help="каталог для БД (по умолчанию временный)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="db_ops_")
+    user_ids = [100000 + random.randrange(args.users) for _ in range(args.ops)]
+    results = {}
+
+    # До: журнал по умолчанию (DELETE), соединение на каждый вызов
+    baseline = Baseline(*prepare(directory, "before", "DELETE"))
+    for name in ("add_used", "can_speak", "increment_stt"):
+        results[name] = [measure(getattr(baseline, name), user_ids)]
+
+    # После: текущие функции модулей на долгоживущих WAL-соединениях
+    prepare(directory, "after", "WAL")
+    user_limits_db.user_cache.invalidate()
+    results["add_used"].append(measure(user_limits_db.add_used, user_ids))
+    results["can_speak"].append(measure(user_limits_db.can_speak, user_ids))
+    # Время сброса буфера аналитики входит в замер
+    results["increment_stt"].append(measure(analytics_db.increment_stt, user_ids, analytics_db.event_buffer.flush))
+
+    print(f"{'функция':<16}{'до, оп/с':>12}{'после, оп/с':>14}{'ускорение':>11}")
+    for name, (before, after) in results.items():
+        print(f"{name:<16}{before:>12.0f}{after:>14.0f}{after / before:>10.1f}x")
+    print(f"БД: {directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Событий аналитики в секунду: запись через буфер (increment_stt -> EventBuffer -> пачки
+executemany) с журналом на диске (fsync на каждое действие) и без него против прямой
+записи каждого события своей транзакцией.
+
+    python -m benchmarks.event_buffer
+    python -m benchmarks.event_buffer --events 200000 --users 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from services import analytics_db
+from services.storage import Database
+
+def use_database(path, journal=None):
+    analytics_db.db = Database(path)
+    analytics_db.event_buffer.journal_path = journal
+    analytics_db.init_db()
+
+def direct(user_ids):
+    # Каждое событие — отдельная транзакция с теми же запросами, что и у сброса буфера
+    for user_id in user_ids:
+        now = datetime.utcnow().isoformat()
+        analytics_db._apply_buffer([(str(user_id), "stt", now, None)], {"total_stt": 1}, {str(user_id): [1, 0, now]})
+
+def buffered(user_ids):
+    for user_id in user_ids:
+        analytics_db.increment_stt(user_id)
+    analytics_db.event_buffer.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность записи аналитики")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--direct-events", type=int, default=20_000, help="прямая запись медленная — меньше событий")
+    parser.add_argument("--journal-events", type=int, default=20_000, help="с журналом fsync на каждое событие")
+    parser.add_argument("--dir", help="каталог для БД (по умолчанию временный)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="event_buffer_")
+    user_ids = [100000 + random.randrange(args.users) for _ in range(max(args.events, args.direct_events, args.journal_events))]
+
+    results = {}
+    runs = (
+        ("прямая запись", "direct", direct, args.direct_events, None),
+        ("буфер", "buffered", buffered, args.events, None),
+        ("буфер + журнал", "journal", buffered, args.journal_events, os.path.join(directory, "stats.journal")),
+    )
+    for name, file, func, count, journal in runs:
+        use_database(os.path.join(directory, f"{file}.db"), journal)
+        started = time.perf_counter()
+        func(user_ids[:count])
+        elapsed = time.perf_counter() - started
+        results[name] = count / elapsed
+        total = analytics_db.get_stats().get("total_stt")
+        print(f"{name:<16} {count:>8} событий за {elapsed:6.2f} с: {results[name]:>9.0f} событий/с (total_stt={total})")
+    for name in ("буфер", "буфер + журнал"):
+        print(f"{name}: {results[name] / results['прямая запись']:.1f}x к прямой записи")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Масштабирование пула синтеза по числу воркеров: для каждого TTS_WORKERS создаёт пул
+через create_executor() (по умолчанию TTS_EXECUTOR=process — процессы со своими
+моделями) и отправляет в него одинаковую пачку запросов synthesize_text_to_audio.
+Каждая конфигурация — отдельный процесс, чтобы config прочитал свои переменные.
+
+    python -m benchmarks.executor_scaling --workers 1,2,4,8 --requests 48
+    python -m benchmarks.executor_scaling --executors thread,process --torch-threads 1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import wait
+from benchmarks.common import summarize, environment
+from benchmarks.synthesis import CORPUS
+
+def run_worker(params):
+    from config import DEFAULT_SPEAKER, TTS_EXECUTOR, TTS_WORKERS, TTS_TORCH_THREADS
+    from models import silero_tts
+
+    lang = params["lang"]
+    speaker = DEFAULT_SPEAKER[lang]
+    started = time.perf_counter()
+    executor = silero_tts.create_executor()
+    try:
+        # Процессы грузят и прогревают модель в initializer (MODEL_PRELOAD), потоки — один раз здесь
+        wait([executor.submit(silero_tts.ensure_warm, lang) for _ in range(TTS_WORKERS)])
+        startup = time.perf_counter() - started
+
+        texts = list(CORPUS[lang].values())
+        items = [texts[i % len(texts)] for i in range(params["requests"])]
+        latencies = []
+
+        def done(submitted):
+            return lambda future: latencies.append(time.perf_counter() - submitted)
+
+        wall_started = time.perf_counter()
+        futures = []
+        for text in items:
+            future = executor.submit(silero_tts.synthesize_text_to_audio, text, speaker)
+            future.add_done_callback(done(time.perf_counter()))
+            futures.append(future)
+        for future in futures:
+            future.result().cleanup()
+        wall = time.perf_counter() - wall_started
+    finally:
+        executor.shutdown(wait=True)
+    return {
+        "executor": TTS_EXECUTOR,
+        "workers": TTS_WORKERS,
+        "torch_threads": TTS_TORCH_THREADS,
+        "startup_seconds": startup,
+        "requests": len(items),
+        "wall_seconds": wall,
+        "throughput_rps": len(items) / wall,
+        "latency_ms": summarize(latencies),
+    }
+
+def run_config(executor, workers, torch_threads, params):
+    env = dict(os.environ, TTS_EXECUTOR=executor, TTS_WORKERS=str(workers),
+               TTS_TORCH_THREADS=str(torch_threads), MODEL_PRELOAD=params["lang"],
+               TTS_SPILL_DIR="", METRICS_PORT="0")
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.executor_scaling", "--worker", json.dumps(params)],
+        env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return {"executor": executor, "workers": workers, "error": proc.stderr.strip()[-2000:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность пула синтеза от числа воркеров")
+    parser.add_argument("--executors", default="process", help="thread, process через запятую")
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count() or 1}", help="значения TTS_WORKERS")
+    parser.add_argument("--torch-threads", type=int, default=1, help="TTS_TORCH_THREADS на воркер")
+    parser.add_argument("--lang", default="ru")
+    parser.add_argument("--requests", type=int, default=48)
+    parser.add_argument("--output", help="куда сохранить JSON-отчёт (по умолчанию — stdout)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+
+    params = {"lang": args.lang, "requests": args.requests}
+    report = {"environment": environment(), "params": params, "configs": []}
+    baseline = {}
+    for executor in [e for e in args.executors.split(",") if e]:
+        for workers in sorted({int(w) for w in args.workers.split(",") if w}):
+            result = run_config(executor, workers, args.torch_threads, params)
+            report["configs"].append(result)
+            if "throughput_rps" not in result:
+                print(f"{executor:<8} workers={workers:<3} ошибка", file=sys.stderr)
+                continue
+            base = baseline.setdefault(executor, result["throughput_rps"])
+            print(f"{executor:<8} workers={workers:<3} {result['throughput_rps']:7.2f} запр/с "
+                  f"(x{result['throughput_rps'] / base:.2f}), p50 {result['latency_ms']['p50']:.0f} мс",
+                  file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
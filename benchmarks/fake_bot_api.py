@@ -0,0 +1,149 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов: бот ходит сюда через
+TELEGRAM_API_URL, обновления подкладываются методом push, а ответы бота (sendMessage,
+sendAudio, sendVoice, sendInvoice, answerCallbackQuery, answerPreCheckoutQuery)
+складываются в очередь своего чата. Считает вызовы и байты загруженных файлов.
+
+    python -m benchmarks.fake_bot_api --port 8081
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Load Test Bot", "username": "load_test_bot"}
+# Дольше не держим getUpdates, чтобы остановка бота не ждала
+MAX_POLL_SECONDS = 1.0
+
+class Reply:
+    __slots__ = ("method", "text", "at", "upload_bytes")
+
+    def __init__(self, method, text, at, upload_bytes):
+        self.method = method
+        self.text = text
+        self.at = at
+        self.upload_bytes = upload_bytes
+
+class FakeBotAPI:
+    def __init__(self):
+        self.updates = []
+        self.last_update_id = 0
+        self.last_message_id = 0
+        self.new_updates = asyncio.Event()
+        self.inboxes = defaultdict(asyncio.Queue)
+        self.calls = Counter()
+        self.upload_bytes = Counter()
+        self.polled = asyncio.Event()
+
+    def push(self, **update):
+        """Кладёт обновление (message=..., callback_query=... и т.п.) в очередь getUpdates."""
+        self.last_update_id += 1
+        self.updates.append({"update_id": self.last_update_id, **update})
+        self.new_updates.set()
+        return self.last_update_id
+
+    def inbox(self, chat_id):
+        return self.inboxes[int(chat_id)]
+
+    def next_message_id(self):
+        self.last_message_id += 1
+        return self.last_message_id
+
+    def message(self, chat_id, **fields):
+        return {
+            "message_id": self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": BOT_USER,
+            **fields,
+        }
+
+    async def get_updates(self, params):
+        self.polled.set()
+        offset = int(params.get("offset") or 0)
+        timeout = min(float(params.get("timeout") or 0), MAX_POLL_SECONDS)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:int(params.get("limit") or 100)]
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = {}
+        uploaded = 0
+        # aiogram шлёт multipart/form-data; файлы приходят отдельными частями
+        for name, value in (await request.post()).items():
+            if isinstance(value, web.FileField):
+                uploaded += len(value.file.read())
+            else:
+                params[name] = value
+        self.calls[method] += 1
+        self.upload_bytes[method] += uploaded
+
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self.get_updates(params)})
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": BOT_USER})
+
+        chat_id = params.get("chat_id")
+        result = True
+        if method == "sendMessage":
+            result = self.message(chat_id, text=params.get("text", ""))
+        elif method in ("sendAudio", "sendVoice"):
+            kind = "audio" if method == "sendAudio" else "voice"
+            file_id = f"{kind}{self.last_message_id + 1}"
+            result = self.message(chat_id, **{kind: {"file_id": file_id, "file_unique_id": file_id, "duration": 1}})
+        elif method == "sendInvoice":
+            prices = json.loads(params.get("prices") or "[]")
+            result = self.message(chat_id, invoice={
+                "title": params.get("title", ""),
+                "description": params.get("description", ""),
+                "start_parameter": params.get("start_parameter", ""),
+                "currency": params.get("currency", ""),
+                "total_amount": sum(p["amount"] for p in prices),
+            })
+        elif method in ("answerCallbackQuery", "answerPreCheckoutQuery"):
+            # id запросов генерирует load_generator в виде "<chat_id>:<n>"
+            query_id = params.get("callback_query_id") or params.get("pre_checkout_query_id") or ""
+            chat_id = query_id.split(":")[0] or None
+
+        if chat_id:
+            text = params.get("text") or params.get("caption") or ""
+            self.inbox(chat_id).put_nowait(Reply(method, text, time.perf_counter(), uploaded))
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, host="127.0.0.1", port=8081):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+async def serve(host, port):
+    api = FakeBotAPI()
+    runner = await api.start(host, port)
+    print(f"Фейковый Bot API: http://{host}:{port} (TELEGRAM_API_URL для бота)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
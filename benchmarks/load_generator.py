@@ -0,0 +1,330 @@
+"""
+Сквозной нагрузочный тест main_menu.router без настоящего Telegram: поднимает локальный
+фейковый Bot API (benchmarks.fake_bot_api), запускает бота в режиме polling и моделирует
+N одновременных пользователей — выбор языка и голоса (lang_/voice_), тексты на озвучку,
+в том числе очередями подряд (упираются в лимит частоты), и покупку пакетов через
+/pay -> счёт -> pre_checkout_query -> successful_payment.
+
+Отчёт: задержка ответа бота по шагам, ожидание в очереди синтеза (из /metrics бота),
+байты загруженного аудио и доля ошибок.
+
+    python -m benchmarks.load_generator --users 50 --texts 10 --output load.json
+    python -m benchmarks.load_generator --no-spawn --api-port 8081 --metrics-url http://127.0.0.1:9100/metrics
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+import aiohttp
+from config import SPEAKERS, MODELS_DIR
+from benchmarks.common import summarize, environment
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.synthesis import CORPUS
+
+ROOT = Path(__file__).resolve().parent.parent
+BOT_TOKEN = "123456:LOADTEST"
+PACKS = ("buy_10_1", "buy_30_2", "buy_50_3")
+
+# Промежуточные ответы на озвучку; всё остальное от бота завершает запрос
+PROGRESS_PREFIXES = ("⏳ Генерирую", "⏱")
+OUTCOMES = (
+    ("⏳ Подождите", "flood"),
+    ("⏳ У вас уже", "user_busy"),
+    ("⏳ Очередь", "overloaded"),
+    ("⏳ Сейчас слишком", "overloaded"),
+    ("У вас закончились", "no_quota"),
+    ("Ошибка", "error"),
+)
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.outcomes = Counter()
+        self.audio_bytes = []
+        self.timeouts = 0
+
+    def report(self):
+        steps = sum(len(v) for v in self.latency.values()) + self.timeouts
+        failed = self.timeouts + self.outcomes["error"]
+        return {
+            "steps": steps,
+            "timeouts": self.timeouts,
+            "error_rate": failed / steps if steps else 0.0,
+            "tts_outcomes": dict(self.outcomes),
+            "latency_ms": {step: summarize(values) for step, values in sorted(self.latency.items())},
+            "upload_bytes": {
+                "total": sum(self.audio_bytes),
+                "files": len(self.audio_bytes),
+                "per_file_mean": sum(self.audio_bytes) / len(self.audio_bytes) if self.audio_bytes else 0,
+            },
+        }
+
+class SimulatedUser:
+    def __init__(self, api, stats, user_id, args):
+        self.api = api
+        self.stats = stats
+        self.user_id = user_id
+        self.args = args
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"load{user_id}", "language_code": "ru"}
+        self.queries = 0
+
+    def message(self, **fields):
+        return {
+            "message_id": self.api.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"},
+            "from": self.user,
+            **fields,
+        }
+
+    def query_id(self):
+        self.queries += 1
+        return f"{self.user_id}:{self.queries}"
+
+    async def step(self, name, update, done):
+        """Отправляет обновление и ждёт ответа бота, для которого done(reply) истинно."""
+        inbox = self.api.inbox(self.user_id)
+        while not inbox.empty():
+            inbox.get_nowait()
+        started = time.perf_counter()
+        self.api.push(**update)
+        deadline = started + self.args.timeout
+        while True:
+            try:
+                reply = await asyncio.wait_for(inbox.get(), max(deadline - time.perf_counter(), 0))
+            except asyncio.TimeoutError:
+                self.stats.timeouts += 1
+                return None
+            if done(reply):
+                self.stats.latency[name].append(reply.at - started)
+                return reply
+
+    async def send_text(self, text, name):
+        return await self.step(name, {"message": self.message(text=text)},
+                               lambda r: r.method == "sendMessage")
+
+    async def press(self, data, name, method="sendMessage"):
+        callback = {
+            "id": self.query_id(),
+            "from": self.user,
+            "chat_instance": str(self.user_id),
+            "message": self.message(text="menu") | {"from": {"id": 1, "is_bot": True, "first_name": "bot"}},
+            "data": data,
+        }
+        return await self.step(name, {"callback_query": callback}, lambda r: r.method == method)
+
+    async def choose_voice(self):
+        lang = random.choice(self.args.langs)
+        await self.send_text("🗣 Озвучить текст", "menu")
+        await self.press(f"lang_{lang}", "lang")
+        await self.press(f"voice_{random.choice(SPEAKERS[lang])}", "voice")
+        return lang
+
+    async def synthesize(self, lang):
+        text = random.choice(list(CORPUS[lang].values()))
+        reply = await self.step(
+            "tts", {"message": self.message(text=text)},
+            lambda r: r.method in ("sendAudio", "sendVoice")
+            or (r.method == "sendMessage" and not r.text.startswith(PROGRESS_PREFIXES))
+        )
+        if reply is None:
+            return "timeout"
+        if reply.method in ("sendAudio", "sendVoice"):
+            self.stats.audio_bytes.append(reply.upload_bytes)
+            outcome = "ok"
+        else:
+            outcome = next((o for prefix, o in OUTCOMES if reply.text.startswith(prefix)), "other")
+        self.stats.outcomes[outcome] += 1
+        return outcome
+
+    async def buy(self):
+        pack = random.choice(PACKS)
+        amount, price = (int(part) for part in pack.split("_")[1:])
+        await self.send_text("/pay", "pay")
+        if not await self.press(pack, "invoice", method="sendInvoice"):
+            return
+        total = price * 10000
+        pre_checkout = {
+            "id": self.query_id(), "from": self.user, "currency": "RUB",
+            "total_amount": total, "invoice_payload": f"tts_pack_{amount}",
+        }
+        await self.step("pre_checkout", {"pre_checkout_query": pre_checkout},
+                        lambda r: r.method == "answerPreCheckoutQuery")
+        payment = {
+            "currency": "RUB", "total_amount": total, "invoice_payload": f"tts_pack_{amount}",
+            "telegram_payment_charge_id": f"tg{self.queries}", "provider_payment_charge_id": f"pr{self.queries}",
+        }
+        await self.step("payment", {"message": self.message(successful_payment=payment)},
+                        lambda r: r.method == "sendMessage")
+
+    async def run(self):
+        # Пользователи приходят не одновременно
+        await asyncio.sleep(random.uniform(0, self.args.ramp_up))
+        await self.send_text("/start", "start")
+        lang = await self.choose_voice()
+        for i in range(self.args.texts):
+            outcome = await self.synthesize(lang)
+            if outcome == "no_quota" or random.random() < self.args.buy_ratio:
+                await self.buy()
+            if random.random() < self.args.switch_ratio:
+                lang = await self.choose_voice()
+            # Часть текстов отправляется сразу, без паузы — так пользователи упираются в лимит частоты
+            if random.random() >= self.args.burst_ratio:
+                await asyncio.sleep(random.uniform(*self.args.think))
+
+def parse_histogram(text, name):
+    """Складывает по меткам бакеты гистограммы Prometheus: {(метка, le): count}, суммы и счётчики."""
+    buckets = Counter()
+    totals = Counter()
+    pattern = re.compile(rf'^{name}_(bucket|sum|count)\{{(.*)\}} (\S+)$')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        kind, labels, value = match.groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+        le = labels.pop("le", None)
+        key = ",".join(labels.values())
+        if kind == "bucket":
+            buckets[(key, le)] += float(value)
+        else:
+            totals[(key, kind)] += float(value)
+    return buckets, totals
+
+def histogram_delta(before, after):
+    buckets = Counter(after[0])
+    buckets.subtract(before[0])
+    totals = Counter(after[1])
+    totals.subtract(before[1])
+    return buckets, totals
+
+def histogram_summary(buckets, totals):
+    """Число, среднее и оценка p50/p90/p99 (верхняя граница бакета) по каждой метке, в мс."""
+    result = {}
+    for key in sorted({key for key, _ in totals}):
+        count = totals[(key, "count")]
+        if not count:
+            continue
+        bounds = sorted(
+            ((float(le), c) for (k, le), c in buckets.items() if k == key),
+            key=lambda item: item[0]
+        )
+        summary = {"count": int(count), "mean": totals[(key, "sum")] / count * 1000}
+        for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            bound = next((b for b, c in bounds if c >= count * q), float("inf"))
+            summary[name] = bound * 1000 if bound != float("inf") else None
+        result[key or "all"] = summary
+    return result
+
+async def scrape(session, url):
+    if not url:
+        return Counter(), Counter()
+    try:
+        async with session.get(url) as response:
+            return parse_histogram(await response.text(), "tts_queue_wait_seconds")
+    except aiohttp.ClientError as e:
+        print(f"Не удалось прочитать {url}: {e}", file=sys.stderr)
+        return Counter(), Counter()
+
+def spawn_bot(api_url, metrics_port, workdir):
+    # Отдельный рабочий каталог — чистые БД лимитов и статистики на каждый прогон
+    env = dict(
+        os.environ, BOT_TOKEN=BOT_TOKEN, PROVIDER_TOKEN="TEST", TELEGRAM_API_URL=api_url,
+        RUN_MODE="polling", METRICS_PORT=str(metrics_port), MODELS_DIR=str(ROOT / MODELS_DIR),
+    )
+    log = open(Path(workdir) / "bot.log", "w", encoding="utf-8")
+    return subprocess.Popen([sys.executable, str(ROOT / "main.py")], cwd=workdir, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+async def run(args):
+    api = FakeBotAPI()
+    runner = await api.start(args.api_host, args.api_port)
+    api_url = f"http://{args.api_host}:{args.api_port}"
+    bot = None
+    if args.spawn:
+        workdir = args.workdir or tempfile.mkdtemp(prefix="load_")
+        bot = spawn_bot(api_url, args.metrics_port, workdir)
+        print(f"Бот запущен (pid {bot.pid}), журнал: {workdir}/bot.log", file=sys.stderr)
+    else:
+        print(f"Ожидание бота с TELEGRAM_API_URL={api_url} ...", file=sys.stderr)
+
+    stats = Stats()
+    try:
+        await asyncio.wait_for(api.polled.wait(), args.startup_timeout)
+        async with aiohttp.ClientSession() as session:
+            before = await scrape(session, args.metrics_url)
+            started = time.perf_counter()
+            users = [SimulatedUser(api, stats, args.first_user_id + i, args) for i in range(args.users)]
+            await asyncio.gather(*(user.run() for user in users))
+            elapsed = time.perf_counter() - started
+            after = await scrape(session, args.metrics_url)
+    finally:
+        if bot:
+            bot.terminate()
+            try:
+                bot.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+        await runner.cleanup()
+
+    report = {
+        "environment": environment(),
+        "params": {
+            "users": args.users, "texts": args.texts, "langs": args.langs,
+            "burst_ratio": args.burst_ratio, "buy_ratio": args.buy_ratio,
+        },
+        "elapsed_seconds": elapsed,
+        "updates": api.last_update_id,
+        "updates_per_second": api.last_update_id / elapsed,
+        **stats.report(),
+        "queue_wait_ms": histogram_summary(*histogram_delta(before, after)),
+        "api_calls": dict(api.calls),
+        "api_upload_bytes": {method: size for method, size in api.upload_bytes.items() if size},
+    }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный тест бота на фейковом Bot API")
+    parser.add_argument("--users", type=int, default=20, help="число одновременных пользователей")
+    parser.add_argument("--texts", type=int, default=5, help="текстов на озвучку от каждого пользователя")
+    parser.add_argument("--langs", default="ru,en", help="языки, из которых выбирают пользователи")
+    parser.add_argument("--burst-ratio", type=float, default=0.3, help="доля текстов, отправленных без паузы")
+    parser.add_argument("--buy-ratio", type=float, default=0.1, help="вероятность покупки пакета после озвучки")
+    parser.add_argument("--switch-ratio", type=float, default=0.1, help="вероятность сменить язык и голос")
+    parser.add_argument("--think", default="1,6", help="пауза между текстами, секунды: мин,макс")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="за сколько секунд приходят все пользователи")
+    parser.add_argument("--timeout", type=float, default=180.0, help="сколько ждать ответа бота на шаг")
+    parser.add_argument("--first-user-id", type=int, default=700000)
+    parser.add_argument("--api-host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--metrics-port", type=int, default=9109, help="порт /metrics запускаемого бота")
+    parser.add_argument("--metrics-url", help="адрес /metrics бота (по умолчанию для запущенного бота)")
+    parser.add_argument("--no-spawn", dest="spawn", action="store_false", help="бот уже запущен отдельно")
+    parser.add_argument("--workdir", help="рабочий каталог запускаемого бота (по умолчанию временный)")
+    parser.add_argument("--startup-timeout", type=float, default=300.0, help="ожидание первого getUpdates")
+    parser.add_argument("--output", help="куда сохранить JSON-отчёт (по умолчанию — stdout)")
+    args = parser.parse_args()
+
+    args.langs = [l for l in args.langs.split(",") if l]
+    args.think = tuple(float(t) for t in args.think.split(","))
+    if args.metrics_url is None and args.spawn:
+        args.metrics_url = f"http://127.0.0.1:{args.metrics_port}/metrics"
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Проверка и бенчмарк нормализации текста: сначала прогоняет набор примеров для
+ru/en/de/fr/es (код выхода 1, если хоть один результат не совпал), затем меряет
+пропускную способность normalize_numbers в символах в секунду.
+
+    python -m benchmarks.normalizer
+    python -m benchmarks.normalizer --check-only
+    python -m benchmarks.normalizer --chars 5000000
+"""
+import argparse
+import sys
+import time
+from utils.normalizer import normalize_numbers
+
+# (язык, текст, ожидаемый результат)
+CASES = [
+    ("ru", "У меня 5 яблок.", "У меня пять яблок."),
+    ("ru", "12.05.2024", "двенадцатое мая две тысячи двадцать четвёртого года"),
+    ("ru", "цена 1500 ₽", "цена одна тысяча пятьсот рублей"),
+    ("ru", "1,5 ₽", "один рубль, пятьдесят копеек"),
+    ("ru", "рост на 15%", "рост на пятнадцать процентов"),
+    ("ru", "1 %", "один процент"),
+    ("ru", "2%", "два процента"),
+    ("ru", "15,5%", "пятнадцать целых пять десятых процента"),
+    ("ru", "в 90-х годах", "в девяностых годах"),
+    ("ru", "5-го числа", "пятого числа"),
+    ("ru", "т.е. так", "то есть так"),
+    ("ru", "0,25", "ноль целых двадцать пять сотых"),
+    ("ru", "цена 1,5.", "цена одна целая пять десятых."),
+    # Единицы после числа согласуются с ним, "см." после числа — сантиметры, а не "смотри"
+    ("ru", "Рост 180 см.", "Рост сто восемьдесят сантиметров."),
+    ("ru", "5 см.", "пять сантиметров."),
+    ("ru", "см. выше", "смотри выше"),
+    ("ru", "1 км", "один километр"),
+    ("ru", "2 км", "два километра"),
+    ("ru", "5 км", "пять километров"),
+    ("ru", "4 кг и 11 кг", "четыре килограмма и одиннадцать килограммов"),
+    ("ru", "1,5 км", "одна целая пять десятых километра"),
+    ("ru", "сотни км", "сотни километров"),
+    ("ru", "1 млн", "один миллион"),
+    ("ru", "3 млн", "три миллиона"),
+    ("ru", "1 тыс.", "одна тысяча"),
+    ("ru", "21 тыс.", "двадцать одна тысяча"),
+    ("ru", "2 тыс. руб", "две тысячи руб"),
+    # Дробь — только если всё число имеет вид 1,5; номера версий и перечисления читаются по числам
+    ("ru", "3.10.2", "три.десять.два"),
+    ("ru", "1,5,7", "один,пять,семь"),
+    ("ru", "версия 2.0.1", "версия два.ноль.один"),
+    ("en", "I have 5 apples.", "I have five apples."),
+    ("en", "On 12/05/2024", "On May twelfth, twenty twenty-four"),
+    ("en", "$1,200.50", "one thousand, two hundred dollars, fifty cents"),
+    ("en", "1,234.5", "one thousand, two hundred and thirty-four point five"),
+    ("en", "15%", "fifteen percent"),
+    ("en", "1st place", "first place"),
+    ("en", "21st", "twenty-first"),
+    ("en", "Mr. Smith", "Mister Smith"),
+    ("en", "3.10.2", "three.ten.two"),
+    ("de", "Ich habe 5 Äpfel.", "Ich habe fünf Äpfel."),
+    ("de", "1200 €", "eintausendzweihundert Euro"),
+    ("de", "15%", "fünfzehn Prozent"),
+    ("de", "z.B. heute", "zum Beispiel heute"),
+    ("de", "3,5", "drei Komma fünf"),
+    ("de", "3.10.2", "drei.zehn.zwei"),
+    ("fr", "J'ai 5 pommes.", "J'ai cinq pommes."),
+    ("fr", "Le 12/05/2024", "Le douze mai deux mille vingt-quatre"),
+    ("fr", "1200 €", "mille deux cents euros"),
+    ("fr", "15%", "quinze pour cent"),
+    ("fr", "1er mai", "premier mai"),
+    ("fr", "3,5", "trois virgule cinq"),
+    ("es", "Tengo 5 manzanas.", "Tengo cinco manzanas."),
+    ("es", "El 12/05/2024", "El doce de mayo de dos mil veinticuatro"),
+    ("es", "1200 €", "mil doscientos euros"),
+    ("es", "15%", "quince por ciento"),
+    ("es", "3.10.2", "tres.diez.dos"),
+]
+
+THROUGHPUT_TEXT = (
+    "12.05.2024 в 15:30 цена выросла на 15% и составила 1500 ₽, т.е. почти вдвое больше. "
+    "Рост 180 см, вес 75 кг, до дачи 42 км, тираж 1,5 млн экземпляров, в 90-х годах — 3 тыс. "
+)
+
+def check():
+    failures = 0
+    for lang, text, expected in CASES:
+        result = normalize_numbers(text, lang=lang)
+        if result != expected:
+            failures += 1
+            print(f"[{lang}] {text!r}\n  ожидалось: {expected!r}\n  получено:  {result!r}")
+    print(f"Примеров: {len(CASES)}, ошибок: {failures}")
+    return failures
+
+def throughput(chars):
+    text = THROUGHPUT_TEXT * max(chars // len(THROUGHPUT_TEXT), 1)
+    # Тексты пользователей короткие, поэтому меряется много вызовов, а не один огромный текст
+    messages = [text[i:i + 500] for i in range(0, len(text), 500)]
+    started = time.perf_counter()
+    for message in messages:
+        normalize_numbers(message, lang="ru")
+    elapsed = time.perf_counter() - started
+    print(f"Нормализация: {len(text) / elapsed:,.0f} символов/с ({len(messages) / elapsed:,.0f} сообщений/с)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и бенчмарк нормализации текста")
+    parser.add_argument("--check-only", action="store_true")
+    parser.add_argument("--chars", type=int, default=2_000_000, help="объём текста для замера скорости")
+    args = parser.parse_args()
+    failures = check()
+    if not args.check_only:
+        throughput(args.chars)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Проверка изоляции параллельных запросов одним голосом: много потоков одновременно
+кодируют (и сбрасывают во временные файлы, TTS_SPILL_DIR) разные сигналы через
+encode_result, затем каждый результат декодируется и сравнивается со своим входом.
+С --synthesize то же для настоящего синтеза: длительность каждого ответа сверяется
+с эталоном, полученным последовательно. Код выхода 1 — если хоть один запрос
+получил чужое аудио.
+
+    python -m benchmarks.spill_concurrency --requests 200 --concurrency 16
+    python -m benchmarks.spill_concurrency --memory --format flac
+    python -m benchmarks.spill_concurrency --synthesize --requests 40
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+
+SYNTH_TEXTS = [
+    "Да.",
+    "Привет, как дела?",
+    "Сегодня хорошая погода для прогулки.",
+    "Съешь же ещё этих мягких французских булок, да выпей чаю.",
+    "В лесу родилась ёлочка, в лесу она росла, зимой и летом стройная, зелёная была.",
+]
+
+def make_signal(index, sample_rate):
+    # У каждого запроса своя длина и частота — чужое аудио не совпадёт ни по одному из признаков
+    samples = sample_rate // 2 + index * 37
+    t = np.arange(samples, dtype=np.float32) / sample_rate
+    return (0.5 * np.sin(2 * np.pi * (200 + index) * t)).astype(np.float32)
+
+def check_encode(silero_tts, speaker, requests, concurrency, repeats):
+    from config import SAMPLE_RATE
+    signals = [make_signal(i, SAMPLE_RATE) for i in range(requests)]
+    errors = 0
+
+    def one(index):
+        result = silero_tts.encode_result(signals[index], speaker)
+        path = result.path
+        try:
+            decoded, _ = sf.read(io.BytesIO(result.read_bytes()), dtype="float32")
+        finally:
+            result.cleanup()
+        expected = signals[index]
+        ok = len(decoded) == len(expected) and float(np.max(np.abs(decoded - expected))) < 1e-3
+        # Временный файл должен удаляться сразу после отправки
+        return index, ok and not (path and os.path.exists(path))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(repeats):
+            for index, ok in pool.map(one, range(requests)):
+                if not ok:
+                    errors += 1
+                    print(f"запрос {index}: получено чужое или испорченное аудио", file=sys.stderr)
+    return errors
+
+def check_synthesize(silero_tts, speaker, requests, concurrency):
+    # Эталон — последовательный синтез; параллельные ответы должны совпасть по длине
+    expected = {}
+    for text in SYNTH_TEXTS:
+        result = silero_tts.synthesize_text_to_audio(text, speaker)
+        expected[text] = sf.info(io.BytesIO(result.read_bytes())).frames
+        result.cleanup()
+    items = [SYNTH_TEXTS[i % len(SYNTH_TEXTS)] for i in range(requests)]
+
+    def one(text):
+        result = silero_tts.synthesize_text_to_audio(text, speaker)
+        try:
+            return text, sf.info(io.BytesIO(result.read_bytes())).frames
+        finally:
+            result.cleanup()
+
+    errors = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for text, frames in pool.map(one, items):
+            if frames != expected[text]:
+                errors += 1
+                print(f"'{text[:30]}': {frames} сэмплов вместо {expected[text]}", file=sys.stderr)
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельные запросы одним голосом не получают чужое аудио")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--speaker", default="baya")
+    parser.add_argument("--format", default="wav", help="wav или flac (форматы без потерь)")
+    parser.add_argument("--memory", action="store_true", help="держать результаты в памяти, без TTS_SPILL_DIR")
+    parser.add_argument("--spill-dir", help="каталог для сброса (по умолчанию временный)")
+    parser.add_argument("--synthesize", action="store_true", help="проверить и настоящий синтез")
+    args = parser.parse_args()
+
+    # config читает окружение при импорте, поэтому режим задаётся до импорта моделей
+    spill_dir = "" if args.memory else (args.spill_dir or tempfile.mkdtemp(prefix="tts_spill_"))
+    os.environ.update(TTS_SPILL_DIR=spill_dir, TTS_SPILL_BYTES="0", OUTPUT_FORMAT=args.format,
+                      METRICS_PORT="0", MODEL_PRELOAD="")
+    from models import silero_tts
+
+    errors = check_encode(silero_tts, args.speaker, args.requests, args.concurrency, args.repeats)
+    print(f"encode_result ({'память' if args.memory else spill_dir}): "
+          f"{args.requests * args.repeats} запросов, ошибок {errors}")
+    if args.synthesize:
+        synth_errors = check_synthesize(silero_tts, args.speaker, args.requests, args.concurrency)
+        print(f"синтез: {args.requests} запросов, ошибок {synth_errors}")
+        errors += synth_errors
+    if spill_dir and not args.spill_dir:
+        leftovers = os.listdir(spill_dir)
+        if leftovers:
+            errors += len(leftovers)
+            print(f"в {spill_dir} остались файлы: {leftovers[:5]}", file=sys.stderr)
+        else:
+            os.rmdir(spill_dir)
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Офлайн-бенчмарк горячего пути синтеза без Telegram: normalize_numbers → синтез → кодирование
+на корпусе текстов ru/en/de/fr/es разной длины, а также время до первого аудио при делении
+длинного текста на куски против синтеза одним вызовом. Перебирает число потоков torch, частоты
+дискретизации, форматы и уровни параллельности; каждая конфигурация — отдельный процесс
+(свои настройки config и честный пик RSS). Отчёт — JSON для сравнения между коммитами.
+
+    python -m benchmarks.synthesis --output bench.json
+    python -m benchmarks.synthesis --threads 1,4 --sample-rates 24000,48000 --concurrency 1,4
+    python -m benchmarks.synthesis --output new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import summarize, peak_rss_mb, environment
+
+CORPUS = {
+    "ru": {
+        "short": "Привет! Как дела?",
+        "medium": "12.05.2024 в 15:30 цена выросла на 15% и составила 1500 ₽, т.е. почти вдвое больше.",
+        "long": ("Съешь же ещё этих мягких французских булок, да выпей чаю. В 2023 году бот озвучил "
+                 "более 250 тысяч сообщений на пяти языках. Средняя длина текста — 180 символов, "
+                 "а самые длинные запросы доходят до 500 символов, поэтому важно, чтобы синтез "
+                 "оставался быстрым при любой нагрузке."),
+    },
+    "en": {
+        "short": "Hello! How are you?",
+        "medium": "On 12/05/2024 the price rose by 15% to $1,200.50, i.e. almost twice as much.",
+        "long": ("The quick brown fox jumps over the lazy dog. In 2023 the bot voiced more than "
+                 "250 thousand messages in five languages. The average text is 180 characters long, "
+                 "and the longest requests reach 500 characters, so synthesis has to stay fast."),
+    },
+    "de": {
+        "short": "Hallo! Wie geht es dir?",
+        "medium": "Am 12.05.2024 stieg der Preis um 15% auf 1200 €, d.h. fast doppelt so viel.",
+        "long": ("Zwölf Boxkämpfer jagen Viktor quer über den großen Sylter Deich. Im Jahr 2023 hat "
+                 "der Bot mehr als 250 Tausend Nachrichten in fünf Sprachen vorgelesen, und die "
+                 "längsten Anfragen erreichen 500 Zeichen."),
+    },
+    "fr": {
+        "short": "Bonjour ! Comment ça va ?",
+        "medium": "Le 12/05/2024, le prix a augmenté de 15% pour atteindre 1200 €.",
+        "long": ("Portez ce vieux whisky au juge blond qui fume. En 2023, le bot a lu plus de "
+                 "250 mille messages en cinq langues, et les demandes les plus longues atteignent "
+                 "500 caractères."),
+    },
+    "es": {
+        "short": "¡Hola! ¿Qué tal?",
+        "medium": "El 12/05/2024 el precio subió un 15% hasta 1200 €.",
+        "long": ("El veloz murciélago hindú comía feliz cardillo y kiwi. En 2023 el bot leyó más de "
+                 "250 mil mensajes en cinco idiomas, y las solicitudes más largas llegan a 500 caracteres."),
+    },
+}
+
+def run_worker(params):
+    """Одна конфигурация (SAMPLE_RATE, потоки и формат уже заданы через окружение)."""
+    from config import DEFAULT_SPEAKER, SAMPLE_RATE, OUTPUT_FORMAT, TTS_TORCH_THREADS
+    from models import silero_tts
+    from utils.normalizer import normalize_numbers
+
+    langs = params["langs"]
+    started = time.perf_counter()
+    silero_tts.init_worker(TTS_TORCH_THREADS, langs)
+    for lang in langs:
+        silero_tts.ensure_warm(lang)
+    load_seconds = time.perf_counter() - started
+
+    def one_request(item):
+        lang, length, text = item
+        speaker = DEFAULT_SPEAKER[lang]
+        t0 = time.perf_counter()
+        normalized = normalize_numbers(text, lang=lang)
+        t1 = time.perf_counter()
+        audio = silero_tts.synthesize_raw(normalized, speaker)
+        t2 = time.perf_counter()
+        result = silero_tts.encode_result(audio, speaker)
+        t3 = time.perf_counter()
+        size = len(result.read_bytes())
+        result.cleanup()
+        audio_seconds = len(audio) / SAMPLE_RATE
+        return {
+            "lang": lang, "length": length, "normalize": t1 - t0, "synthesize": t2 - t1,
+            "encode": t3 - t2, "total": t3 - t0, "audio_seconds": audio_seconds, "bytes": size,
+        }
+
+    items = [
+        (lang, length, text)
+        for lang in langs for length, text in CORPUS[lang].items()
+    ] * params["repeats"]
+    runs = []
+    for concurrency in params["concurrency"]:
+        wall_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one_request, items))
+        wall = time.perf_counter() - wall_started
+        audio_total = sum(r["audio_seconds"] for r in results)
+        runs.append({
+            "concurrency": concurrency,
+            "requests": len(results),
+            "wall_seconds": wall,
+            "throughput_rps": len(results) / wall,
+            "audio_seconds_per_second": audio_total / wall,
+            "rtf": sum(r["synthesize"] for r in results) / audio_total if audio_total else None,
+            "rtf_by_length": {
+                length: sum(r["synthesize"] for r in results if r["length"] == length)
+                / max(sum(r["audio_seconds"] for r in results if r["length"] == length), 1e-9)
+                for length in ("short", "medium", "long")
+            },
+            "bytes_per_audio_second": sum(r["bytes"] for r in results) / audio_total if audio_total else None,
+            "stages_ms": {stage: summarize([r[stage] for r in results])
+                          for stage in ("normalize", "synthesize", "encode", "total")},
+        })
+    return {
+        "threads": TTS_TORCH_THREADS,
+        "streaming": measure_streaming(silero_tts, langs, params),
+        "sample_rate": SAMPLE_RATE,
+        "format": OUTPUT_FORMAT,
+        "load_and_warmup_seconds": load_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "runs": runs,
+    }
+
+def measure_streaming(silero_tts, langs, params):
+    """
+    Длинный текст одним вызовом против деления на куски (TTS_STREAM_MODE): время до
+    первого готового куска (stream), до всех кусков и до склеенного файла (concat).
+    Куски синтезируются параллельно в пуле из concurrency потоков, как в боте.
+    """
+    from config import DEFAULT_SPEAKER
+    from utils.normalizer import normalize_numbers
+
+    texts = [
+        (lang, normalize_numbers(f"{CORPUS[lang]['medium']} {CORPUS[lang]['long']}", lang=lang))
+        for lang in langs
+    ]
+    runs = []
+    for concurrency in params["concurrency"]:
+        timings = {"single": [], "stream_first_audio": [], "stream_total": [], "concat_total": []}
+        chunk_counts = []
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(params["repeats"]):
+                for lang, text in texts:
+                    speaker = DEFAULT_SPEAKER[lang]
+                    t0 = time.perf_counter()
+                    silero_tts.synthesize_text_to_audio(text, speaker).cleanup()
+                    timings["single"].append(time.perf_counter() - t0)
+
+                    chunks = silero_tts.split_text(text)
+                    chunk_counts.append(len(chunks))
+                    t0 = time.perf_counter()
+                    futures = [pool.submit(silero_tts.synthesize_text_to_audio, c, speaker) for c in chunks]
+                    futures[0].result()
+                    timings["stream_first_audio"].append(time.perf_counter() - t0)
+                    for future in futures:
+                        future.result().cleanup()
+                    timings["stream_total"].append(time.perf_counter() - t0)
+
+                    t0 = time.perf_counter()
+                    audios = list(pool.map(lambda c: silero_tts.synthesize_raw(c, speaker), chunks))
+                    silero_tts.join_and_encode(audios, speaker).cleanup()
+                    timings["concat_total"].append(time.perf_counter() - t0)
+        runs.append({
+            "concurrency": concurrency,
+            "chunks_mean": sum(chunk_counts) / len(chunk_counts),
+            "latency_ms": {name: summarize(values) for name, values in timings.items()},
+        })
+    return runs
+
+def run_config(threads, sample_rate, fmt, params):
+    env = dict(os.environ, TTS_TORCH_THREADS=str(threads), SAMPLE_RATE=str(sample_rate), OUTPUT_FORMAT=fmt,
+               TTS_CHUNK_CHARS=str(params["chunk_chars"]), TTS_SPILL_DIR="", METRICS_PORT="0")
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.synthesis", "--worker", json.dumps(params)],
+        env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return {"threads": threads, "sample_rate": sample_rate, "format": fmt, "error": proc.stderr.strip()[-2000:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(report, baseline, threshold=0.1):
+    """Печатает конфигурации, где p50 общего времени или RTF выросли больше threshold."""
+    def index(rep):
+        return {
+            (c["threads"], c["sample_rate"], c["format"], r["concurrency"]): r
+            for c in rep["configs"] if "runs" in c for r in c["runs"]
+        }
+    old, new = index(baseline), index(report)
+    regressions = 0
+    for key, run in new.items():
+        if key not in old:
+            continue
+        for name, before, after in (
+            ("total p50", old[key]["stages_ms"]["total"]["p50"], run["stages_ms"]["total"]["p50"]),
+            ("rtf", old[key]["rtf"], run["rtf"]),
+        ):
+            if before and after and after > before * (1 + threshold):
+                regressions += 1
+                print(f"РЕГРЕССИЯ {key}: {name} {before:.3f} -> {after:.3f} (+{(after / before - 1) * 100:.0f}%)")
+    print(f"Сравнение с {baseline['environment'].get('revision')}: регрессий {regressions}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк синтеза речи")
+    parser.add_argument("--langs", default=",".join(CORPUS))
+    parser.add_argument("--threads", default="1,2,4", help="числа потоков torch")
+    parser.add_argument("--sample-rates", default="8000,24000,48000")
+    parser.add_argument("--formats", default="wav", help="wav, ogg, flac, mp3 через запятую")
+    parser.add_argument("--concurrency", default="1,2,4", help="уровни параллельных запросов")
+    parser.add_argument("--repeats", type=int, default=3, help="сколько раз прогнать корпус на каждом уровне")
+    parser.add_argument("--chunk-chars", type=int, default=120, help="TTS_CHUNK_CHARS для замера деления на куски")
+    parser.add_argument("--output", help="куда сохранить JSON-отчёт (по умолчанию — stdout)")
+    parser.add_argument("--compare", help="JSON-отчёт прошлого прогона для поиска регрессий")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+
+    split = lambda value: [v for v in value.split(",") if v]
+    params = {
+        "langs": split(args.langs),
+        "concurrency": [int(c) for c in split(args.concurrency)],
+        "repeats": args.repeats,
+        "chunk_chars": args.chunk_chars,
+    }
+    report = {"environment": environment(), "params": params, "configs": []}
+    for threads in [int(t) for t in split(args.threads)]:
+        for sample_rate in [int(sr) for sr in split(args.sample_rates)]:
+            for fmt in split(args.formats):
+                print(f"threads={threads} sample_rate={sample_rate} format={fmt} ...", file=sys.stderr)
+                report["configs"].append(run_config(threads, sample_rate, fmt, params))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            sys.exit(1 if compare(report, json.load(f)) else 0)
+
+if __name__ == "__main__":
+    main()
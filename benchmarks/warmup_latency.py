@@ -0,0 +1,56 @@
+"""
+Задержка первого запроса к холодной модели против установившейся и после прогрева.
+
+    python -m benchmarks.warmup_latency --langs ru,en --runs 5
+"""
+import argparse
+import statistics
+import time
+import torch
+from config import MODEL_VERSIONS, SAMPLE_RATE, SPEAKERS, TTS_TORCH_THREADS
+from models import silero_tts
+from models.prepare import SAMPLE_TEXTS
+
+REQUEST_TEXT = "Проверка задержки первого запроса после запуска бота."
+
+def timed(model, text, speaker):
+    started = time.perf_counter()
+    model.apply_tts(text=text, speaker=speaker, sample_rate=SAMPLE_RATE)
+    return time.perf_counter() - started
+
+def measure(lang, runs):
+    text = REQUEST_TEXT if lang == "ru" else SAMPLE_TEXTS[lang]
+    speakers = SPEAKERS[lang]
+
+    # Холодная модель: первый запрос сразу после загрузки
+    model = silero_tts.load_model(lang)
+    cold_first = timed(model, text, speakers[-1])
+    steady = statistics.median(timed(model, text, speakers[-1]) for _ in range(runs))
+    del model
+
+    # Прогретая модель: первый «пользовательский» запрос после ensure_warm
+    silero_tts.registry.evict(lang)
+    warmup_seconds = silero_tts.ensure_warm(lang)
+    warm_first = timed(silero_tts.registry.get(lang), text, speakers[-1])
+    silero_tts.registry.evict(lang)
+    return {
+        "cold_first_ms": cold_first * 1000,
+        "steady_ms": steady * 1000,
+        "warmup_s": warmup_seconds,
+        "warm_first_ms": warm_first * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка первого запроса и эффект прогрева")
+    parser.add_argument("--langs", default=",".join(MODEL_VERSIONS))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    torch.set_num_threads(TTS_TORCH_THREADS)
+
+    print(f"{'язык':<6}{'холодный 1-й, мс':>18}{'устойч., мс':>14}{'прогрев, с':>12}{'после прогрева, мс':>20}")
+    for lang in [l for l in args.langs.split(",") if l]:
+        r = measure(lang, args.runs)
+        print(f"{lang:<6}{r['cold_first_ms']:>18.0f}{r['steady_ms']:>14.0f}{r['warmup_s']:>12.1f}{r['warm_first_ms']:>20.0f}")
+
+if __name__ == "__main__":
+    main()
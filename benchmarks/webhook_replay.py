@@ -0,0 +1,143 @@
+"""
+Нагрузочный тест вебхука: отправляет записанные обновления Telegram на локальный сервер
+и считает задержку ответа (p50/p90/p99).
+
+Бот запускается отдельно в режиме вебхука, с ответом после обработки и без настоящего
+Bot API (иначе сообщения уйдут реальным пользователям):
+
+    RUN_MODE=webhook WEBHOOK_IN_BACKGROUND=0 TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+
+    python -m benchmarks.webhook_replay --updates updates.jsonl --concurrency 50
+    python -m benchmarks.webhook_replay --synthetic 2000 --users 200
+
+Перед синтетическими сообщениями каждый пользователь выбирает русский язык и случайный
+голос (колбэки lang_/voice_), иначе текст не дойдёт до синтеза. Эти обновления в замер
+задержки не входят.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import aiohttp
+from config import SPEAKERS, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+from benchmarks.common import percentile
+
+SYNTHETIC_TEXTS = [
+    "/start",
+    "Привет! Это проверка озвучки.",
+    "12.05.2024 в 15:30 цена выросла на 15% до 1500 ₽.",
+    "Съешь же ещё этих мягких французских булок, да выпей чаю.",
+]
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def make_user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"load{user_id}"}
+
+def synthetic_updates(count, users):
+    updates = []
+    for i in range(count):
+        user_id = 100000 + random.randrange(users)
+        user = make_user(user_id)
+        updates.append({
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": user,
+                "text": random.choice(SYNTHETIC_TEXTS),
+            },
+        })
+    return updates
+
+def voice_setup(updates, lang="ru"):
+    """Колбэки lang_ и voice_ для каждого пользователя из updates: два этапа по порядку."""
+    user_ids = sorted({u["message"]["from"]["id"] for u in updates if "message" in u})
+    update_id = max((u["update_id"] for u in updates), default=0)
+    stages = []
+    for data in (lambda: f"lang_{lang}", lambda: f"voice_{random.choice(SPEAKERS[lang])}"):
+        stage = []
+        for user_id in user_ids:
+            update_id += 1
+            stage.append({
+                "update_id": update_id,
+                "callback_query": {
+                    "id": str(update_id),
+                    "from": make_user(user_id),
+                    "chat_instance": str(user_id),
+                    "message": {
+                        "message_id": update_id,
+                        "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"},
+                        "from": {"id": 1, "is_bot": True, "first_name": "bot"},
+                        "text": "menu",
+                    },
+                    "data": data(),
+                },
+            })
+        stages.append(stage)
+    return stages
+
+async def replay(url, updates, concurrency, secret):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async def worker(session):
+        nonlocal errors
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return sorted(latencies), errors, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест вебхука бота")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET)
+    parser.add_argument("--updates", help="JSONL с записанными обновлениями (по одному Update в строке)")
+    parser.add_argument("--synthetic", type=int, default=1000, help="сколько обновлений сгенерировать без --updates")
+    parser.add_argument("--users", type=int, default=100, help="число разных пользователей в синтетике")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз прогнать набор обновлений")
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates) if args.updates else synthetic_updates(args.synthetic, args.users)
+    if not args.updates:
+        # Ответ приходит после обработки, поэтому к началу следующего этапа настройки уже сохранены
+        for stage in voice_setup(updates):
+            _, setup_errors, _ = asyncio.run(replay(args.url, stage, args.concurrency, args.secret))
+            if setup_errors:
+                print(f"Выбор языка и голоса: ошибок {setup_errors} из {len(stage)}")
+    updates = updates * args.repeat
+    latencies, errors, elapsed = asyncio.run(replay(args.url, updates, args.concurrency, args.secret))
+
+    print(f"Обновлений: {len(updates)}, ошибок: {errors}, за {elapsed:.1f} с ({len(updates) / elapsed:.0f} в секунду)")
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        print(f"{name}: {percentile(latencies, q) * 1000:.1f} мс")
+    if latencies:
+        print(f"max: {latencies[-1] * 1000:.1f} мс")
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,10 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 PROVIDER_TOKEN = os.getenv("PROVIDER_TOKEN")
-SAMPLE_RATE = 48000
+# Частота синтеза: 8000, 24000 или 48000 (поддерживаемые Silero v3)
+SAMPLE_RATE = int(os.getenv("SAMPLE_RATE", "48000"))
+# Формат отправляемого аудио: wav, ogg (Opus, отправляется как голосовое), flac, mp3
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "wav")
 
 # Только реально поддерживаемые языки и спикеры Silero TTS (2024)
 SPEAKERS = {
@@ -16,6 +19,15 @@ SPEAKERS = {
     "es": ['es_0', 'es_1', 'es_2'],
 }
 
+# Версии моделей Silero для каждого языка
+MODEL_VERSIONS = {
+    "ru": "v3_1_ru",
+    "en": "v3_en",
+    "de": "v3_de",
+    "fr": "v3_fr",
+    "es": "v3_es",
+}
+
 DEFAULT_SPEAKER = {
     "ru": "baya",
     "en": "en_0",
@@ -23,3 +35,130 @@ DEFAULT_SPEAKER = {
     "fr": "fr_0",
     "es": "es_0",
 }
+
+# Пул синтеза: "thread" — потоки в процессе бота, "process" — отдельные процессы со своими моделями
+TTS_EXECUTOR = os.getenv("TTS_EXECUTOR", "thread")
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "3"))
+# Потоки torch внутри одного воркера (intra-op)
+TTS_TORCH_THREADS = int(os.getenv("TTS_TORCH_THREADS", str(max((os.cpu_count() or 1) // TTS_WORKERS, 1))))
+
+# Кэш готовых озвучек на диске
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "cache/audio")
+AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "500"))
+
+# Большие результаты синтеза сбрасываются во временный файл (например, в tmpfs /dev/shm)
+# вместо хранения в памяти. Пустое значение — всегда держать аудио в памяти.
+TTS_SPILL_DIR = os.getenv("TTS_SPILL_DIR", "")
+TTS_SPILL_BYTES = int(os.getenv("TTS_SPILL_BYTES", str(8 * 1024 * 1024)))
+
+# Модели загружаются по требованию; эти языки прогружаются в фоне после старта
+MODEL_PRELOAD = [l for l in os.getenv("MODEL_PRELOAD", "ru").split(",") if l]
+# Выгружать модели, не использовавшиеся дольше N минут (0 — никогда); при TTS_EXECUTOR=process — в каждом воркере пула
+MODEL_IDLE_MINUTES = int(os.getenv("MODEL_IDLE_MINUTES", "60"))
+# Ограничение памяти под загруженные модели (0 — без ограничений)
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
+# Локальные артефакты моделей (готовятся командой python -m models.prepare)
+MODELS_DIR = os.getenv("MODELS_DIR", "models/artifacts")
+# Точность модели: fp32 (скачивается models.prepare). Другая — только если её артефакт
+# <версия>.<точность>.pt положен в MODELS_DIR; int8 из TorchScript-моделей Silero v3 не собирается
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32")
+# Не обращаться к сети/torch.hub: модели только из MODELS_DIR
+TTS_OFFLINE = os.getenv("TTS_OFFLINE", "0") == "1"
+
+# Длинные тексты делятся на предложения и синтезируются параллельно:
+# "off" — одним вызовом, "concat" — склейка в один файл, "stream" — отдельными сообщениями по мере готовности
+TTS_STREAM_MODE = os.getenv("TTS_STREAM_MODE", "off")
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "250"))
+TTS_CROSSFADE_MS = int(os.getenv("TTS_CROSSFADE_MS", "20"))
+MAX_TEXT_LENGTH = int(os.getenv("MAX_TEXT_LENGTH", "500" if TTS_STREAM_MODE == "off" else "2000"))
+
+# Буфер аналитики: сброс в stats.db каждые N секунд или при накоплении M событий
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "2"))
+ANALYTICS_BUFFER_SIZE = int(os.getenv("ANALYTICS_BUFFER_SIZE", "1000"))
+# Сколько событий держать, пока БД недоступна (старые сверх лимита отбрасываются)
+ANALYTICS_BUFFER_MAX_EVENTS = int(os.getenv("ANALYTICS_BUFFER_MAX_EVENTS", "50000"))
+# Журнал буфера аналитики (сегменты <путь>.N с fsync): после падения недописанное восстанавливается при старте.
+# Пусто — без журнала, при падении теряется то, что не успело сброситься
+ANALYTICS_JOURNAL = os.getenv("ANALYTICS_JOURNAL", "stats.journal")
+
+# Сколько строк user_limits держать в памяти
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+# Выбранные язык и голос: сколько держать в памяти и как часто сохранять в БД
+USER_PREFS_CACHE_SIZE = int(os.getenv("USER_PREFS_CACHE_SIZE", "50000"))
+USER_PREFS_FLUSH_SECONDS = float(os.getenv("USER_PREFS_FLUSH_SECONDS", "2"))
+
+# Антифлуд: "ёмкость:секунд на запрос" для каждого тарифа
+def _parse_rate(value):
+    capacity, period = value.split(":")
+    return int(capacity), float(period)
+
+RATE_LIMITS = {
+    "free": _parse_rate(os.getenv("RATE_LIMIT_FREE", "1:5")),
+    "paid": _parse_rate(os.getenv("RATE_LIMIT_PAID", "3:2")),
+}
+# Общий лимит оценочных секунд синтеза в очереди (0 — без ограничения)
+MAX_QUEUED_SYNTH_SECONDS = float(os.getenv("MAX_QUEUED_SYNTH_SECONDS", "0"))
+# Оценка времени синтеза на символ текста
+SYNTH_SECONDS_PER_CHAR = float(os.getenv("SYNTH_SECONDS_PER_CHAR", "0.01"))
+# Файл для сохранения состояния антифлуда между перезапусками (пусто — не сохранять)
+RATE_LIMIT_STATE_FILE = os.getenv("RATE_LIMIT_STATE_FILE", "")
+
+# Очередь синтеза: отказ, если оценка ожидания больше (секунд, 0 — без ограничения)
+TTS_MAX_WAIT_SECONDS = float(os.getenv("TTS_MAX_WAIT_SECONDS", "120"))
+# Сколько запросов одного пользователя может ждать в очереди (выполняется всегда один)
+TTS_USER_MAX_QUEUED = int(os.getenv("TTS_USER_MAX_QUEUED", "3"))
+# Сколько платных задач подряд можно взять, пока ждут бесплатные
+TTS_PAID_WEIGHT = int(os.getenv("TTS_PAID_WEIGHT", "3"))
+
+# Файл запрещённых слов (перечитывается при изменении) и режим совпадения целым словом
+BLOCKED_WORDS_FILE = os.getenv("BLOCKED_WORDS_FILE", "blocked_words.txt")
+BLOCKED_WORDS_WHOLE = os.getenv("BLOCKED_WORDS_WHOLE", "0") == "1"
+
+# Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics (0 — выключены)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Режим получения обновлений: "polling" или "webhook"
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+# Публичный адрес бота (https://example.com), путь и секрет вебхука
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Локальный адрес aiohttp-сервера вебхука
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Сколько параллельных соединений Telegram откроет к вебхуку (1–100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+# 0 — отвечать Telegram только после обработки (нужно для нагрузочного теста)
+WEBHOOK_IN_BACKGROUND = os.getenv("WEBHOOK_IN_BACKGROUND", "1") == "1"
+# Лимит исходящих соединений к Bot API
+TELEGRAM_CONNECTIONS = int(os.getenv("TELEGRAM_CONNECTIONS", "100"))
+# Сколько секунд при остановке ждать завершения начатых озвучек
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "60"))
+# Свой сервер Bot API (локальный telegram-bot-api или заглушка для тестов), пусто — api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Где выполняется синтез: "local" — пул в процессе бота, "broker" — отдельные воркеры (python worker.py)
+TTS_BACKEND = os.getenv("TTS_BACKEND", "local")
+# Очередь задач брокера (SQLite, общий файл для бота и воркеров на одной машине)
+TTS_BROKER_DB = os.getenv("TTS_BROKER_DB", "tts_jobs.db")
+# Сколько секунд воркер может держать задачу, прежде чем её отдадут другому
+TTS_BROKER_JOB_TIMEOUT = float(os.getenv("TTS_BROKER_JOB_TIMEOUT", "60"))
+# Сколько раз пробовать задачу (ошибки и таймауты воркеров)
+TTS_BROKER_MAX_ATTEMPTS = int(os.getenv("TTS_BROKER_MAX_ATTEMPTS", "3"))
+# Максимум задач в брокере: при превышении новые запросы отклоняются
+TTS_BROKER_MAX_PENDING = int(os.getenv("TTS_BROKER_MAX_PENDING", "200"))
+# Сколько задач бот одновременно держит в брокере и как часто проверяет результаты
+TTS_BROKER_INFLIGHT = int(os.getenv("TTS_BROKER_INFLIGHT", "16"))
+TTS_BROKER_POLL_MS = float(os.getenv("TTS_BROKER_POLL_MS", "50"))
+
+# Хранение журналов (дней, 0 — хранить всё): старые строки уходят в архив и сводки
+RETENTION_EVENTS_DAYS = int(os.getenv("RETENTION_EVENTS_DAYS", "90"))
+RETENTION_ERRORS_DAYS = int(os.getenv("RETENTION_ERRORS_DAYS", "30"))
+RETENTION_HISTORY_DAYS = int(os.getenv("RETENTION_HISTORY_DAYS", "365"))
+# Месячные архивы gzip JSONL (пусто — удалять без архива)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Период обслуживания БД и размер одной порции удаления
+MAINTENANCE_INTERVAL_MINUTES = float(os.getenv("MAINTENANCE_INTERVAL_MINUTES", "60"))
+MAINTENANCE_CHUNK_ROWS = int(os.getenv("MAINTENANCE_CHUNK_ROWS", "500"))
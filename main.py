@@ -1,19 +1,148 @@
 import asyncio
-from aiogram import Bot, Dispatcher
+import signal
+from aiohttp import web
+from aiogram import Bot, Dispatcher, BaseMiddleware
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer, PRODUCTION
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from main_menu import router
-from config import BOT_TOKEN
+from services.tts_queue import tts_queue
+from models.silero_tts import preload_models
+from services.rate_limiter import rate_limiter
+from config import (
+    BOT_TOKEN, METRICS_HOST, METRICS_PORT, RUN_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_MAX_CONNECTIONS, WEBHOOK_IN_BACKGROUND, TELEGRAM_CONNECTIONS,
+    TELEGRAM_API_URL, SHUTDOWN_DRAIN_SECONDS, TTS_BACKEND
+)
+from utils.metrics import start_metrics_server
 from services.user_limits_db import init_db
 init_db()
 from services.analytics_db import init_db
 init_db()
+from services import user_limits_db, analytics_db
+from services.job_broker import job_broker, broker_client
+from services.user_prefs import user_prefs
+from services.maintenance import init_maintenance, run_maintenance
+init_maintenance()
+if TTS_BACKEND == "broker":
+    job_broker.init()
+    # Задачи, брошенные до перезапуска, иначе остались бы в очереди вместе с результатами
+    broker_client.purge_stale()
 
-bot = Bot(token=BOT_TOKEN)
+background_tasks = set()
+metrics_runner = None
+
+class InFlightUpdates(BaseMiddleware):
+    """Считает обновления в обработке, чтобы при остановке дождаться начатых озвучек."""
+
+    def __init__(self):
+        self.count = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    async def __call__(self, handler, event, data):
+        self.count += 1
+        self.idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.count -= 1
+            if not self.count:
+                self.idle.set()
+
+    async def drain(self, timeout):
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Остановка: не дождались {self.count} обновлений за {timeout:.0f} с.")
+
+in_flight = InFlightUpdates()
+
+def start_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def on_startup():
+    global metrics_runner
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    analytics_db.event_buffer.start()
+    user_prefs.start()
+    rate_limiter.load()
+    start_background(rate_limiter.run_pruning())
+    start_background(run_maintenance())
+    # Модели грузятся в фоне, чтобы не задерживать начало приёма обновлений
+    start_background(preload_models())
+
+async def on_shutdown():
+    # Новые обновления уже не принимаются — дожидаемся начатых озвучек
+    await in_flight.drain(SHUTDOWN_DRAIN_SECONDS)
+    for task in background_tasks:
+        task.cancel()
+    # Недописанная аналитика сохраняется до выхода
+    await analytics_db.event_buffer.stop()
+    await user_prefs.stop()
+    rate_limiter.save()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=WEBHOOK_IN_BACKGROUND,
+        secret_token=WEBHOOK_SECRET or None,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, backlog=1024)
+    await site.start()
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    print(f"Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать запросы и дожидаемся начатых озвучек, пока сессия бота открыта.
+        # Вебхук не удаляется: Telegram придержит обновления до перезапуска
+        await site.stop()
+        await in_flight.drain(SHUTDOWN_DRAIN_SECONDS)
+        await runner.cleanup()
 
 async def main():
-    bot = Bot(token=BOT_TOKEN)
+    api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+    bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=api, limit=TELEGRAM_CONNECTIONS))
     dp = Dispatcher()
+    dp.update.outer_middleware(in_flight)
     dp.include_router(router)
-    await dp.start_polling(bot)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    try:
+        if RUN_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        tts_queue.shutdown()
+        await bot.session.close()
+        user_limits_db.db.close()
+        analytics_db.db.close()
+        job_broker.db.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
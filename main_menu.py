@@ -1,35 +1,34 @@
+import asyncio
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, FSInputFile, LabeledPrice, PreCheckoutQuery
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, FSInputFile, BufferedInputFile, LabeledPrice, PreCheckoutQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.enums import ParseMode
-from config import PROVIDER_TOKEN, SPEAKERS
-from models.silero_tts import queue_tts_synthesis
+from config import (
+    PROVIDER_TOKEN, SPEAKERS, OUTPUT_FORMAT, TTS_STREAM_MODE, MAX_TEXT_LENGTH, SYNTH_SECONDS_PER_CHAR,
+    BLOCKED_WORDS_FILE, BLOCKED_WORDS_WHOLE
+)
+from models.silero_tts import queue_tts_synthesis, synthesis_cache_key, split_text
+from services.audio_cache import audio_cache
 from utils.normalizer import normalize_numbers
 from services.analytics_db import (
-    get_stats, increment_tts, increment_purchase, register_user
+    get_stats, increment_tts, increment_purchase, register_user, inc_stat
 )
 from services.user_limits_db import (
-    get_left, get_user_limit,
-    add_used, can_speak, can_request, set_last_request, seconds_to_wait, add_purchased
+    get_left, get_user_limit, cached_user_limit, count_left, user_tier,
+    add_purchased, admit_request, commit_request, rollback_request, ADMIT_NO_QUOTA
 )
-from pathlib import Path
+from services.rate_limiter import rate_limiter
+from services.tts_queue import tts_queue, QueueRejected
+from utils.word_filter import BlockedWordsMatcher
 from services.analytics_db import log_event
+from services.storage import run_db
+from services.user_prefs import user_prefs
+from utils.metrics import NORMALIZE_SECONDS, UPLOAD_SECONDS
 
-def load_blocked_words(path: str = "blocked_words.txt") -> set:
-    file = Path(path)
-    if not file.exists():
-        return set()
-    return set(
-        line.strip().lower()
-        for line in file.read_text(encoding="utf-8").splitlines()
-        if line.strip() and not line.startswith("#")
-    )
-
-BLOCKED_WORDS = load_blocked_words()
+# Запрещённые слова: автомат собирается один раз и пересобирается при изменении файла
+blocked_words = BlockedWordsMatcher(BLOCKED_WORDS_FILE, whole_words=BLOCKED_WORDS_WHOLE)
 router = Router()
-user_speakers = {}
-user_languages = {}
 
 speaker_names = {
     # RU
@@ -83,7 +82,7 @@ async def start(message: Message):
         "Я — твой голосовой помощник. Озвучу любой твой текст разными голосами и на разных языках — быстро и качественно!</b>\n\n"
         "Как пользоваться ботом:\n"
         "1️⃣ Сначала выберите язык и голос (🗣 Озвучить текст)\n"
-        "2️⃣ Затем отправьте текст (до 500 символов)\n"
+        f"2️⃣ Затем отправьте текст (до {MAX_TEXT_LENGTH} символов)\n"
         "3️⃣ Получите аудиофайл\n\n"
         "Вам доступно <b>20 бесплатных озвучек</b>!\n"
         "Можно купить ещё озвучки (💰 Купить озвучки)\n\n"
@@ -107,8 +106,8 @@ async def buy_menu_command(message: Message):
 @router.message(Command("balance"))
 async def handle_balance(message: Message):
     user_id = message.from_user.id
-    left = get_left(user_id)
-    user_data = get_user_limit(user_id)
+    user_data = await get_limit(user_id)
+    left = count_left(user_data)
     total_used = user_data.get("used", 0)
     text = (
         f"🗣 <b>Ваш баланс</b>\n\n"
@@ -124,12 +123,12 @@ async def help_handler(message: Message):
     text = (
         "🤖 <b>Помощь по использованию бота</b>\n\n"
         "<b>Возможности:</b>\n"
-        "• Озвучивание любого текста выбранным языком и голосом (до 500 символов за раз)\n"
+        f"• Озвучивание любого текста выбранным языком и голосом (до {MAX_TEXT_LENGTH} символов за раз)\n"
         "• 20 бесплатных озвучек\n"
         "• Возможность покупки дополнительных пакетов озвучек\n\n"
         "<b>Как пользоваться:</b>\n"
         "1. Нажмите кнопку \"Озвучить текст\", выберите язык и голос\n"
-        "2. Отправьте текст (до 500 символов)\n"
+        f"2. Отправьте текст (до {MAX_TEXT_LENGTH} символов)\n"
         "3. Получите аудиофайл в ответ\n\n"
         "<b>Баланс и покупки:</b>\n"
         "• Узнать остаток озвучек — (💼 Мой баланс)\n"
@@ -184,7 +183,7 @@ async def help_handler_old(message: Message):
 async def handle_language(callback: CallbackQuery):
     user_id = callback.from_user.id
     lang = callback.data.replace("lang_", "")
-    user_languages[user_id] = lang
+    user_prefs.set_lang(user_id, lang)
 
     kb = InlineKeyboardBuilder()
     speakers = SPEAKERS.get(lang, [])
@@ -215,15 +214,15 @@ async def handle_language(callback: CallbackQuery):
 async def set_voice(callback: CallbackQuery):
     user_id = callback.from_user.id
     speaker = callback.data.replace("voice_", "")
-    user_speakers[user_id] = speaker
-    lang = user_languages.get(user_id, "ru")
+    user_prefs.set_speaker(user_id, speaker)
+    lang = (await get_prefs(user_id)).lang or "ru"
     lang_label = {
         "ru": "Русский", "en": "Английский", "de": "Немецкий", "fr": "Французский",
         "es": "Испанский"
     }
     speaker_display = speaker_names.get(speaker, speaker.capitalize())
     await callback.message.answer(
-        f"✅ Голос <b>{speaker_display}</b> выбран ({lang_label.get(lang, lang.capitalize())}).\nТеперь пришлите текст для озвучки (до 500 символов).",
+        f"✅ Голос <b>{speaker_display}</b> выбран ({lang_label.get(lang, lang.capitalize())}).\nТеперь пришлите текст для озвучки (до {MAX_TEXT_LENGTH} символов).",
         parse_mode=ParseMode.HTML
     )
     await callback.answer()
@@ -265,9 +264,9 @@ async def process_successful_payment(message: Message):
     user_id = message.from_user.id
     if payload.startswith("tts_pack_"):
         amount = int(payload.replace("tts_pack_", ""))
-        add_purchased(user_id, amount)
-        increment_purchase(user_id, amount)
-        left = get_left(user_id)
+        await run_db(add_purchased, user_id, amount)
+        await run_db(increment_purchase, user_id, amount)
+        left = await run_db(get_left, user_id)
         await message.answer(
             f"✅ Платёж успешен! Вам начислено {amount} озвучек.\n"
             f"Теперь у вас {left} озвучек."
@@ -277,59 +276,170 @@ async def process_successful_payment(message: Message):
 async def tts_message(message: Message):
     user_id = message.from_user.id
 
-    if not can_request(user_id):
-        sec = seconds_to_wait(user_id)
-        await message.answer(f"⏳ Подождите {sec} сек. перед следующей озвучкой.")
-        return
-
-    speaker = user_speakers.get(user_id)
+    prefs = await get_prefs(user_id)
+    speaker = prefs.speaker
     if not speaker:
         await message.answer("Сначала выберите язык и голос через кнопку (🗣 Озвучить текст).")
         return
     text = message.text.strip()
-    lower_text = text.lower()
-    for word in BLOCKED_WORDS:
-        if word in lower_text:
-            log_event(
-                user_id,
-                action="violation",
-                details=f"blocked_word={word}; text={text[:100]}"
-            )
-            await message.answer("⚠️ Текст содержит запрещённые слова и не может быть озвучен.")
-            return
+    found_words = blocked_words.find_all(text)
+    if found_words:
+        await run_db(
+            log_event,
+            user_id,
+            action="violation",
+            details=f"blocked_word={','.join(found_words)}; text={text[:100]}"
+        )
+        await message.answer("⚠️ Текст содержит запрещённые слова и не может быть озвучен.")
+        return
 
     if not text:
         await message.answer("Пожалуйста, отправьте текст для озвучки.")
         return
-    if len(text) > 500:
-        await message.answer("⚠️ Текст слишком длинный! Максимум 500 символов.")
+    if len(text) > MAX_TEXT_LENGTH:
+        await message.answer(f"⚠️ Текст слишком длинный! Максимум {MAX_TEXT_LENGTH} символов.")
+        return
+    tier = user_tier(await get_limit(user_id))
+    allowed, sec = rate_limiter.check(user_id, tier)
+    if not allowed:
+        await message.answer(f"⏳ Подождите {sec} сек. перед следующей озвучкой.")
+        return
+    try:
+        tts_queue.check_admission(user_id, len(text), tier)
+    except QueueRejected as e:
+        rate_limiter.refund(user_id, tier)
+        if e.reason == "user_busy":
+            await message.answer(f"⏳ У вас уже есть озвучки в очереди. Попробуйте через {e.retry_after} сек.")
+        else:
+            await message.answer(f"⏳ Очередь на озвучку переполнена. Попробуйте через {e.retry_after} сек.")
         return
-    if not can_speak(user_id):
+    est_seconds = len(text) * SYNTH_SECONDS_PER_CHAR
+    if not rate_limiter.reserve(est_seconds):
+        rate_limiter.refund(user_id, tier)
+        await message.answer("⏳ Сейчас слишком много запросов на озвучку. Попробуйте через минуту.")
+        return
+    # Резерв общей очереди освобождается на любом выходе: ошибка БД, ошибка отправки, отмена
+    try:
+        await voice_text(message, text, speaker, prefs.lang or "ru", tier)
+    finally:
+        rate_limiter.release(est_seconds)
+
+async def voice_text(message: Message, text, speaker, lang, tier):
+    """Резервирует озвучку в лимите пользователя, синтезирует и отправляет аудио."""
+    user_id = message.from_user.id
+    status = await run_db(admit_request, user_id)
+    if status == ADMIT_NO_QUOTA:
+        rate_limiter.refund(user_id, tier)
         await message.answer("У вас закончились бесплатные и купленные озвучки.\nПополните баланс через (💰 Купить озвучки).")
         return
 
-    set_last_request(user_id)
-    lang = user_languages.get(user_id, "ru")
     lang_label = {
         "ru": "Русский", "en": "Английский", "de": "Немецкий", "fr": "Французский",
         "es": "Испанский", "tt": "Татарский", "uz": "Узбекский",
         "ba": "Башкирский", "xal": "Калмыцкий"
     }
     speaker_display = speaker_names.get(speaker, speaker.capitalize())
-    await message.answer(f"⏳ Генерирую озвучку голосом <b>{speaker_display}</b> ({lang_label.get(lang, lang.capitalize())})...", parse_mode=ParseMode.HTML)
+    # Аудио (хотя бы часть) уже у пользователя: лимит не возвращается, ошибка учёта не показывается
+    delivered = False
+    cache_key = file_id = sent_file = None
     try:
-        normalized_text = normalize_numbers(text, lang=lang)
-        audio_path = await queue_tts_synthesis(
-            normalized_text,
-            speaker,
-            user_id=user_id,
-            notify_func=message.bot.send_message
-        )
-        add_used(user_id)
-        increment_tts(user_id)
-        await message.answer_audio(FSInputFile(audio_path), title=f"Голос: {speaker_display}")
-        import os
-        os.remove(audio_path)
+        # Статус — уже после резервирования лимита, поэтому тоже внутри try: при ошибке отправки лимит вернётся
+        await message.answer(f"⏳ Генерирую озвучку голосом <b>{speaker_display}</b> ({lang_label.get(lang, lang.capitalize())})...", parse_mode=ParseMode.HTML)
+        with NORMALIZE_SECONDS.time(lang):
+            normalized_text = normalize_numbers(text, lang=lang)
+        if TTS_STREAM_MODE == "stream" and len(split_text(normalized_text)) > 1:
+            # Длинный текст: части отправляются по мере готовности, без кэша
+            async def send_chunk(result):
+                nonlocal delivered
+                try:
+                    await send_audio(message, as_input_file(result), speaker_display)
+                    delivered = True
+                finally:
+                    result.cleanup()
+
+            await queue_tts_synthesis(
+                normalized_text,
+                speaker,
+                user_id=user_id,
+                notify_func=message.bot.send_message,
+                on_chunk=send_chunk,
+                priority=tier
+            )
+        else:
+            cache_key = synthesis_cache_key(normalized_text, speaker)
+            # Кэш на диске: чтение, копирование файлов и запись file_id — в потоке, не в event loop
+            cached_path, file_id = await asyncio.to_thread(audio_cache.get, cache_key)
+            result = None
+            if cached_path:
+                await run_db(inc_stat, "tts_cache_hits")
+                audio = file_id or FSInputFile(cached_path)
+            else:
+                await run_db(inc_stat, "tts_cache_misses")
+                result = await queue_tts_synthesis(
+                    normalized_text,
+                    speaker,
+                    user_id=user_id,
+                    notify_func=message.bot.send_message,
+                    priority=tier
+                )
+                if result.path:
+                    await asyncio.to_thread(audio_cache.put_file, cache_key, result.path)
+                else:
+                    await asyncio.to_thread(audio_cache.put, cache_key, result.data)
+                audio = as_input_file(result)
+            try:
+                sent_file = await send_audio(message, audio, speaker_display)
+                delivered = True
+            finally:
+                if result:
+                    result.cleanup()
+    except QueueRejected as e:
+        # Очередь воркеров переполнена (TTS_BACKEND=broker)
+        await message.answer(f"⏳ Очередь на озвучку переполнена. Попробуйте через {e.retry_after} сек.")
     except Exception as e:
-        await message.answer("Ошибка при генерации или отправке аудиофайла.")
-        print("TTS error:", e)
\ No newline at end of file
+        print("TTS error:", e)
+        if delivered:
+            # Потоковый режим: часть кусков уже отправлена
+            await message.answer("Не удалось озвучить текст до конца.")
+        else:
+            await message.answer("Ошибка при генерации или отправке аудиофайла.")
+    finally:
+        # На любом выходе, в том числе при отмене (остановка бота): недоставленная озвучка возвращается в лимит
+        await finish_request(user_id, delivered)
+    if sent_file and sent_file.file_id != file_id:
+        try:
+            await asyncio.to_thread(audio_cache.set_file_id, cache_key, sent_file.file_id)
+        except OSError as e:
+            print("Audio cache error:", e)
+
+async def finish_request(user_id, delivered):
+    """Учёт озвучки: доставленная подтверждается, недоставленная возвращается в лимит. Ошибки только логируются."""
+    for func in (commit_request, increment_tts) if delivered else (rollback_request,):
+        try:
+            await run_db(func, user_id)
+        except Exception as e:
+            print(f"TTS accounting error ({func.__name__}):", e)
+
+async def get_prefs(user_id):
+    """Язык и голос пользователя: из памяти, а при промахе — из БД."""
+    return user_prefs.cached(user_id) or await run_db(user_prefs.get, user_id)
+
+async def get_limit(user_id):
+    """Лимиты пользователя: из кэша в памяти, а при промахе — из БД."""
+    return cached_user_limit(user_id) or await run_db(get_user_limit, user_id)
+
+def as_input_file(result):
+    if result.path:
+        return FSInputFile(result.path)
+    return BufferedInputFile(result.data, filename=result.filename)
+
+async def send_audio(message: Message, audio, speaker_display):
+    """Отправляет аудио пользователю и возвращает объект файла Telegram (с file_id)."""
+    kind = "file_id" if isinstance(audio, str) else "upload"
+    with UPLOAD_SECONDS.time(kind):
+        if OUTPUT_FORMAT == "ogg":
+            # OGG/Opus Telegram показывает как голосовое сообщение
+            sent = await message.answer_voice(audio, caption=f"Голос: {speaker_display}")
+            return sent.voice
+        sent = await message.answer_audio(audio, title=f"Голос: {speaker_display}")
+        return sent.audio
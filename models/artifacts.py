@@ -0,0 +1,21 @@
+from pathlib import Path
+import torch
+from torch.package import PackageImporter
+from config import MODELS_DIR
+
+MODEL_URL = "https://models.silero.ai/models/tts/{lang}/{version}.pt"
+
+def artifact_path(version, precision="fp32"):
+    suffix = ".pt" if precision == "fp32" else f".{precision}.pt"
+    return Path(MODELS_DIR) / f"{version}{suffix}"
+
+def load_artifact(path):
+    """Загружает модель Silero из локального torch.package без обращения к сети."""
+    return PackageImporter(str(path)).load_pickle("tts_models", "model")
+
+def download_artifact(lang, version):
+    path = artifact_path(version)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        torch.hub.download_url_to_file(MODEL_URL.format(lang=lang, version=version), str(path))
+    return path
@@ -0,0 +1,62 @@
+"""
+Подготовка локальных артефактов моделей для быстрого холодного старта без сети.
+
+    python -m models.prepare                 # скачать fp32-модели всех языков
+    python -m models.prepare --compare       # сравнить время загрузки, память и RTF
+"""
+import argparse
+import gc
+import time
+from config import MODEL_VERSIONS, SAMPLE_RATE, DEFAULT_SPEAKER, MODEL_PRECISION
+from models.artifacts import artifact_path, download_artifact, load_artifact
+from models.registry import rss_bytes
+
+SAMPLE_TEXTS = {
+    "ru": "Съешь же ещё этих мягких французских булок, да выпей чаю.",
+    "en": "The quick brown fox jumps over the lazy dog.",
+    "de": "Zwölf Boxkämpfer jagen Viktor quer über den großen Sylter Deich.",
+    "fr": "Portez ce vieux whisky au juge blond qui fume.",
+    "es": "El veloz murciélago hindú comía feliz cardillo y kiwi.",
+}
+
+def prepare(langs):
+    for lang in langs:
+        version = MODEL_VERSIONS[lang]
+        path = download_artifact(lang, version)
+        print(f"[{lang}] fp32: {path}")
+
+def compare(langs):
+    for lang in langs:
+        version = MODEL_VERSIONS[lang]
+        for precision in dict.fromkeys(("fp32", MODEL_PRECISION)):
+            path = artifact_path(version, precision)
+            if not path.exists():
+                continue
+            gc.collect()
+            rss_before = rss_bytes()
+            started = time.perf_counter()
+            model = load_artifact(path)
+            load_seconds = time.perf_counter() - started
+            rss_delta = rss_bytes() - rss_before
+            started = time.perf_counter()
+            audio = model.apply_tts(text=SAMPLE_TEXTS[lang], speaker=DEFAULT_SPEAKER[lang], sample_rate=SAMPLE_RATE)
+            synth_seconds = time.perf_counter() - started
+            rtf = synth_seconds / (len(audio) / SAMPLE_RATE)
+            print(
+                f"[{lang}] {precision}: загрузка {load_seconds:.2f} с, "
+                f"RSS +{rss_delta / 2**20:.0f} МБ, RTF {rtf:.3f}"
+            )
+            del model, audio
+
+def main():
+    parser = argparse.ArgumentParser(description="Подготовка локальных моделей Silero TTS")
+    parser.add_argument("--langs", default=",".join(MODEL_VERSIONS), help="языки через запятую")
+    parser.add_argument("--compare", action="store_true", help="сравнить загрузку, память и RTF артефактов")
+    args = parser.parse_args()
+    langs = [l for l in args.langs.split(",") if l]
+    prepare(langs)
+    if args.compare:
+        compare(langs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+def rss_bytes():
+    """Текущий резидентный размер процесса (Linux), 0 если недоступно."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+class ModelRegistry:
+    """
+    Реестр моделей по языкам: модель загружается при первом обращении,
+    простаивающие дольше idle_seconds выгружаются, суммарная память
+    загруженных моделей ограничивается memory_budget (0 — без ограничений).
+    """
+
+    def __init__(self, loader, idle_seconds=0, memory_budget=0):
+        self.loader = loader
+        self.idle_seconds = idle_seconds
+        self.memory_budget = memory_budget
+        self.models = OrderedDict()  # lang -> модель, в порядке последнего использования
+        self.info = {}  # lang -> метрики загрузки
+        self.lock = threading.Lock()
+        self.load_locks = {}
+
+    def _load_lock(self, lang):
+        with self.lock:
+            return self.load_locks.setdefault(lang, threading.Lock())
+
+    def _touch(self, lang):
+        self.models.move_to_end(lang)
+        self.info[lang]["last_used"] = time.monotonic()
+
+    def get(self, lang):
+        with self.lock:
+            model = self.models.get(lang)
+            if model is not None:
+                self._touch(lang)
+        if model is None:
+            model = self._load(lang)
+        self.evict_idle()
+        return model
+
+    def _load(self, lang):
+        # Отдельная блокировка на язык: параллельные запросы ждут одну загрузку, а не грузят копии
+        with self._load_lock(lang):
+            with self.lock:
+                model = self.models.get(lang)
+                if model is not None:
+                    self._touch(lang)
+                    return model
+            rss_before = rss_bytes()
+            started = time.perf_counter()
+            model = self.loader(lang)
+            load_seconds = time.perf_counter() - started
+            with self.lock:
+                self.models[lang] = model
+                info = self.info.setdefault(lang, {"loads": 0})
+                info["loads"] += 1
+                info["load_seconds"] = load_seconds
+                info["rss_bytes"] = max(rss_bytes() - rss_before, 0)
+                info["last_used"] = time.monotonic()
+                self._enforce_budget(keep=lang)
+            print(f"Модель '{lang}' загружена за {load_seconds:.1f} с.")
+            return model
+
+    def preload(self, langs):
+        for lang in langs:
+            self.get(lang)
+
+    def loaded(self):
+        with self.lock:
+            return list(self.models)
+
+    def evict(self, lang):
+        with self.lock:
+            self.models.pop(lang, None)
+
+    def evict_idle(self):
+        if not self.idle_seconds:
+            return
+        deadline = time.monotonic() - self.idle_seconds
+        with self.lock:
+            for lang in [l for l in self.models if self.info[l]["last_used"] < deadline]:
+                del self.models[lang]
+                print(f"Модель '{lang}' выгружена после простоя.")
+
+    def _enforce_budget(self, keep):
+        if not self.memory_budget:
+            return
+        while len(self.models) > 1:
+            used = sum(self.info[l].get("rss_bytes", 0) for l in self.models)
+            if used <= self.memory_budget:
+                return
+            oldest = next(l for l in self.models if l != keep)
+            del self.models[oldest]
+            print(f"Модель '{oldest}' выгружена: превышен бюджет памяти.")
+
+    def stats(self):
+        with self.lock:
+            return {
+                lang: {
+                    "loaded": lang in self.models,
+                    "loads": info["loads"],
+                    "load_seconds": info.get("load_seconds", 0.0),
+                    "rss_bytes": info.get("rss_bytes", 0),
+                }
+                for lang, info in self.info.items()
+            }
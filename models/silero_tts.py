@@ -1,67 +1,365 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
 import torch
-import soundfile as sf
-from config import SAMPLE_RATE, DEFAULT_SPEAKER, SPEAKERS
+from config import (
+    SAMPLE_RATE, DEFAULT_SPEAKER, SPEAKERS, MODEL_VERSIONS, TTS_EXECUTOR, TTS_WORKERS, TTS_TORCH_THREADS,
+    TTS_SPILL_DIR, TTS_SPILL_BYTES, OUTPUT_FORMAT, MODEL_PRELOAD, MODEL_IDLE_MINUTES, MODEL_MEMORY_BUDGET_MB,
+    MODELS_DIR, MODEL_PRECISION, TTS_OFFLINE, TTS_STREAM_MODE, TTS_CHUNK_CHARS, TTS_CROSSFADE_MS,
+    TTS_BACKEND
+)
+from models.artifacts import artifact_path, load_artifact
+from models.registry import ModelRegistry
+from models.prepare import SAMPLE_TEXTS
 from services.tts_queue import tts_queue
+from services.job_broker import broker_client
+from services.audio_cache import make_key
+from utils.metrics import (
+    SYNTH_SECONDS, ENCODE_SECONDS, REALTIME_FACTOR, MODELS_LOADED, LANGUAGE_READY,
+    MODEL_LOAD_SECONDS, MODEL_RSS_BYTES
+)
+from utils.audio_encoder import encode_audio, file_extension, FORMATS, SUPPORTED_SAMPLE_RATES
 
-print("Загрузка Silero TTS моделей...")
+if SAMPLE_RATE not in SUPPORTED_SAMPLE_RATES:
+    raise ValueError(f"SAMPLE_RATE={SAMPLE_RATE} не поддерживается Silero, допустимо: {SUPPORTED_SAMPLE_RATES}")
+if OUTPUT_FORMAT not in FORMATS:
+    raise ValueError(f"OUTPUT_FORMAT={OUTPUT_FORMAT} не поддерживается, допустимо: {tuple(FORMATS)}")
 
-ru_model, _ = torch.hub.load(
-    repo_or_dir='snakers4/silero-models',
-    model='silero_tts',
-    language='ru',
-    speaker='v3_1_ru'
-)
-en_model, _ = torch.hub.load(
-    repo_or_dir='snakers4/silero-models',
-    model='silero_tts',
-    language='en',
-    speaker='v3_en'
-)
-de_model, _ = torch.hub.load(
-    repo_or_dir='snakers4/silero-models',
-    model='silero_tts',
-    language='de',
-    speaker='v3_de'
-)
-fr_model, _ = torch.hub.load(
-    repo_or_dir='snakers4/silero-models',
-    model='silero_tts',
-    language='fr',
-    speaker='v3_fr'
-)
-es_model, _ = torch.hub.load(
-    repo_or_dir='snakers4/silero-models',
-    model='silero_tts',
-    language='es',
-    speaker='v3_es'
+# Точность моделей, загруженных в этом процессе (lang -> "fp32" / MODEL_PRECISION)
+loaded_precision = {}
+
+def model_precision(lang):
+    """Точность, с которой загружается модель языка: MODEL_PRECISION, если её артефакт подготовлен, иначе fp32."""
+    if MODEL_PRECISION != "fp32" and artifact_path(MODEL_VERSIONS[lang], MODEL_PRECISION).exists():
+        return MODEL_PRECISION
+    return "fp32"
+
+def load_model(lang):
+    version = MODEL_VERSIONS[lang]
+    precision = model_precision(lang)
+    if precision != MODEL_PRECISION:
+        print(f"Внимание: нет модели {MODEL_PRECISION} для '{lang}' "
+              f"({artifact_path(version, MODEL_PRECISION)}), загружается fp32.")
+    loaded_precision[lang] = precision
+    # Сначала локальный артефакт (python -m models.prepare), затем torch.hub. Ошибка загрузки
+    # артефакта не подменяется молча другой точностью: иначе кэш аудио получил бы не тот ключ
+    path = artifact_path(version, precision)
+    if path.exists():
+        return load_artifact(path)
+    if TTS_OFFLINE:
+        raise FileNotFoundError(f"Нет локальной модели {version} в {MODELS_DIR}, а TTS_OFFLINE=1")
+    model, _ = torch.hub.load(
+        repo_or_dir='snakers4/silero-models',
+        model='silero_tts',
+        language=lang,
+        speaker=version
+    )
+    return model
+
+registry = ModelRegistry(
+    load_model,
+    idle_seconds=MODEL_IDLE_MINUTES * 60,
+    memory_budget=MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
 )
 
-print("Модели загружены.")
+# Прогретые голоса моделей этого процесса (после выгрузки и повторной загрузки модель снова холодная)
+_warm_speakers = weakref.WeakKeyDictionary()
+_warm_locks = {}
+_warm_locks_guard = threading.Lock()
 
-def get_lang_and_model(speaker):
-    if speaker in SPEAKERS["en"]:
-        return "en", en_model
-    if speaker in SPEAKERS["de"]:
-        return "de", de_model
-    if speaker in SPEAKERS["fr"]:
-        return "fr", fr_model
-    if speaker in SPEAKERS["es"]:
-        return "es", es_model
-    return "ru", ru_model
+def ensure_warm(lang, speaker=None):
+    """
+    Прогоняет короткую фразу голосами языка, которые в этом процессе ещё не
+    звучали: torch выделяет буферы, а JIT проходит профилирующие запуски.
+    Без speaker прогреваются все голоса (фоновый прогрев, воркеры), со speaker —
+    только он: так запрос к холодному языку ждёт один-два коротких прогона,
+    а не все голоса. Возвращает время прогрева в секундах (0, если уже тёплая).
+    """
+    model = registry.get(lang)
+    speakers = [speaker] if speaker else SPEAKERS.get(lang) or [DEFAULT_SPEAKER[lang]]
+    warm = _warm_speakers.get(model, ())
+    if all(s in warm for s in speakers):
+        return 0.0
+    with _warm_locks_guard:
+        lock = _warm_locks.setdefault(lang, threading.Lock())
+    with lock:
+        warm = _warm_speakers.setdefault(model, set())
+        cold = [s for s in speakers if s not in warm]
+        if not cold:
+            return 0.0
+        started = time.perf_counter()
+        text = SAMPLE_TEXTS.get(lang, SAMPLE_TEXTS["en"])
+        # У холодной модели первый голос дважды: оптимизированный граф JIT строится со второго вызова
+        for s in ([] if warm else [cold[0]]) + cold:
+            model.apply_tts(text=text, speaker=s, sample_rate=SAMPLE_RATE)
+            warm.add(s)
+        return time.perf_counter() - started
 
-def synthesize_text_to_audio(text, speaker):
-    lang, model = get_lang_and_model(speaker)
+IDLE_CHECK_SECONDS = 60
+
+def _evict_idle_loop():
+    while True:
+        time.sleep(IDLE_CHECK_SECONDS)
+        registry.evict_idle()
+
+def init_worker(num_threads=TTS_TORCH_THREADS, preload=()):
+    """Инициализация воркера пула: число потоков torch и (для процессов) свои прогретые копии моделей."""
+    torch.set_num_threads(num_threads)
+    registry.preload(preload)
+    if TTS_EXECUTOR == "process":
+        for lang in preload:
+            ensure_warm(lang)
+        # У каждого процесса свой реестр: простаивающие модели выгружаются в нём самом,
+        # даже если задачи до этого процесса не доходят
+        if MODEL_IDLE_MINUTES:
+            threading.Thread(target=_evict_idle_loop, name="model-evict", daemon=True).start()
+
+def create_executor():
+    if TTS_EXECUTOR == "process":
+        # spawn, а не fork: форк процесса с уже запущенными потоками torch может зависнуть
+        return ProcessPoolExecutor(
+            max_workers=TTS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(TTS_TORCH_THREADS, tuple(MODEL_PRELOAD)),
+        )
+    init_worker(TTS_TORCH_THREADS)
+    return ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+tts_queue.executor_factory = create_executor
+MODELS_LOADED.set_function(lambda: len(registry.loaded()))
+
+def _loaded_model_stat(name):
+    return lambda: {(lang,): info[name] for lang, info in registry.stats().items() if info["loaded"]}
+
+MODEL_LOAD_SECONDS.set_function(_loaded_model_stat("load_seconds"))
+MODEL_RSS_BYTES.set_function(_loaded_model_stat("rss_bytes"))
+
+# Готовность языков в боте: пока событие не установлено, запросы этого языка ждут прогрева
+language_ready = {}
+
+def readiness():
+    return {lang: "warm" if event.is_set() else "warming" for lang, event in language_ready.items()}
+
+LANGUAGE_READY.set_function(lambda: {(lang,): int(event.is_set()) for lang, event in language_ready.items()})
+
+async def warmup_language(lang):
+    event = language_ready.setdefault(lang, asyncio.Event())
+    started = time.perf_counter()
+    try:
+        # В режиме процессов прогревается каждый воркер (initializer + эти вызовы)
+        copies = TTS_WORKERS if TTS_EXECUTOR == "process" else 1
+        await asyncio.gather(*[tts_queue.run_in_executor(ensure_warm, lang) for _ in range(copies)])
+        print(f"Язык '{lang}' прогрет за {time.perf_counter() - started:.1f} с.")
+    except Exception as e:
+        print(f"Прогрев '{lang}' не удался: {e}")
+    finally:
+        # Даже при ошибке запросы не должны ждать вечно — они прогреют модель сами
+        event.set()
+
+async def wait_ready(lang):
+    event = language_ready.get(lang)
+    if event is not None and not event.is_set():
+        await event.wait()
+
+async def preload_models():
+    """Фоновые загрузка и прогрев MODEL_PRELOAD после старта бота и периодическая выгрузка простаивающих моделей."""
+    if TTS_BACKEND == "broker":
+        # Модели держат и прогревают воркеры брокера, а не бот
+        return
+    for lang in MODEL_PRELOAD:
+        language_ready.setdefault(lang, asyncio.Event())
+    # В режиме процессов это же заодно запускает воркеры, которые грузят модели в initializer
+    for lang in MODEL_PRELOAD:
+        await warmup_language(lang)
+    # В режиме процессов модели держат воркеры пула и выгружают их сами (init_worker)
+    if TTS_EXECUTOR == "process" or not MODEL_IDLE_MINUTES:
+        return
+    while True:
+        await asyncio.sleep(IDLE_CHECK_SECONDS)
+        registry.evict_idle()
+
+def get_speaker_lang(speaker):
+    for lang, speakers in SPEAKERS.items():
+        if speaker in speakers:
+            return lang
+    return "ru"
+
+class AudioResult:
+    """Результат синтеза: аудио в памяти (data) или во временном файле (path)."""
+    __slots__ = ("data", "path", "filename")
+
+    def __init__(self, data=None, path=None, filename="audio.wav"):
+        self.data = data
+        self.path = path
+        self.filename = filename
+
+    def read_bytes(self):
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def cleanup(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+SENTENCE_BREAK = re.compile(r'(?<=[.!?…])\s+')
+CLAUSE_BREAK = re.compile(r'(?<=[,;:—])\s+')
+
+def _split_long(piece, max_chars):
+    if len(piece) <= max_chars:
+        return [piece]
+    parts = CLAUSE_BREAK.split(piece)
+    if len(parts) == 1:
+        parts = piece.split()
+    return [p for part in parts for p in _split_long(part, max_chars)] if len(parts) > 1 else [piece]
+
+def split_text(text, max_chars=TTS_CHUNK_CHARS):
+    """Делит текст на куски не длиннее max_chars по границам предложений, затем фраз и слов."""
+    pieces = []
+    for sentence in SENTENCE_BREAK.split(text.strip()):
+        pieces.extend(_split_long(sentence, max_chars))
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        elif piece:
+            chunks.append(piece)
+    return chunks
+
+def synthesis_cache_key(text, speaker):
+    lang = get_speaker_lang(speaker)
+    # Точность фактически загруженной модели; в режиме процессов и брокера бот модели не грузит —
+    # тогда по тем же правилам, по которым их загрузят воркеры
+    variant = loaded_precision.get(lang) or model_precision(lang)
+    if TTS_STREAM_MODE != "off" and len(split_text(text)) > 1:
+        # Склеенный из кусков звук отличается от синтеза одним вызовом
+        variant += f":chunks={TTS_STREAM_MODE},{TTS_CHUNK_CHARS},{TTS_CROSSFADE_MS}"
+    return make_key(text, speaker, SAMPLE_RATE, MODEL_VERSIONS[lang], OUTPUT_FORMAT, variant)
+
+def crossfade_concat(chunks, fade_samples):
+    """Склеивает куски аудио с короткими линейными переходами, чтобы не было щелчков на стыках."""
+    out = chunks[0]
+    for chunk in chunks[1:]:
+        n = min(fade_samples, len(out), len(chunk))
+        if n == 0:
+            out = np.concatenate([out, chunk])
+            continue
+        ramp = np.linspace(0.0, 1.0, n, dtype=out.dtype)
+        mixed = out[-n:] * (1.0 - ramp) + chunk[:n] * ramp
+        out = np.concatenate([out[:-n], mixed, chunk[n:]])
+    return out
+
+def synthesize_raw(text, speaker):
+    lang = get_speaker_lang(speaker)
+    # Холодная модель (не из MODEL_PRELOAD или выгруженная) прогревается до запроса, но только этим голосом
+    ensure_warm(lang, speaker)
+    model = registry.get(lang)
+    started = time.perf_counter()
     audio = model.apply_tts(
         text=text,
         speaker=speaker,
         sample_rate=SAMPLE_RATE
     )
-    file_path = f"output_{speaker}.wav"
-    sf.write(file_path, audio, SAMPLE_RATE)
-    return file_path
+    elapsed = time.perf_counter() - started
+    SYNTH_SECONDS.observe(elapsed, lang)
+    if len(audio):
+        REALTIME_FACTOR.observe(elapsed * SAMPLE_RATE / len(audio), speaker)
+    return audio.numpy()
 
-async def queue_tts_synthesis(text, speaker, user_id=None, notify_func=None):
-    async def job():
+def encode_result(audio, speaker):
+    with ENCODE_SECONDS.time(OUTPUT_FORMAT):
+        data = encode_audio(audio, SAMPLE_RATE, OUTPUT_FORMAT)
+    suffix = file_extension(OUTPUT_FORMAT)
+    if TTS_SPILL_DIR and len(data) > TTS_SPILL_BYTES:
+        # Уникальное имя на каждый запрос: параллельные запросы одним голосом не пересекаются
+        fd, file_path = tempfile.mkstemp(prefix=f"tts_{speaker}_", suffix=suffix, dir=TTS_SPILL_DIR)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return AudioResult(path=file_path, filename=f"audio{suffix}")
+    return AudioResult(data=data, filename=f"audio{suffix}")
+
+def join_and_encode(chunks, speaker):
+    fade_samples = SAMPLE_RATE * TTS_CROSSFADE_MS // 1000
+    return encode_result(crossfade_concat(chunks, fade_samples), speaker)
+
+def synthesize_text_to_audio(text, speaker):
+    return encode_result(synthesize_raw(text, speaker), speaker)
+
+def synthesize_full(text, speaker):
+    """Текст целиком одним файлом: длинный делится на куски и склеивается (задача воркера брокера)."""
+    chunks = split_text(text) if TTS_STREAM_MODE != "off" else [text]
+    if len(chunks) == 1:
         return synthesize_text_to_audio(text, speaker)
+    return join_and_encode([synthesize_raw(chunk, speaker) for chunk in chunks], speaker)
 
-    return await tts_queue.run(job, user_id=user_id, notify_func=notify_func)
\ No newline at end of file
+async def synthesize(text, speaker, priority="free"):
+    if TTS_BACKEND == "broker":
+        data, path, filename = await broker_client.synthesize(
+            get_speaker_lang(speaker), speaker, text, priority=int(priority == "paid")
+        )
+        return AudioResult(data=data, path=path, filename=filename)
+    await wait_ready(get_speaker_lang(speaker))
+    # Пакетного прохода у Silero v3 нет (apply_tts принимает один текст), поэтому каждый
+    # запрос — отдельная задача пула: так запросы идут параллельно на TTS_WORKERS воркерах
+    return await tts_queue.run_in_executor(synthesize_text_to_audio, text, speaker)
+
+async def queue_tts_synthesis(text, speaker, user_id=None, notify_func=None, on_chunk=None, priority="free"):
+    """
+    Ставит синтез в очередь. В режиме TTS_STREAM_MODE длинный текст делится на куски,
+    которые синтезируются параллельно в пуле; с on_chunk каждый готовый кусок
+    (по порядку) передаётся в колбэк, иначе куски склеиваются в один файл.
+    priority — тариф пользователя ("paid" / "free") для очереди.
+    """
+    chunks = split_text(text) if TTS_STREAM_MODE != "off" else [text]
+
+    async def job():
+        # Синтез выполняется в пуле воркеров, event loop бота остаётся свободным
+        if len(chunks) == 1:
+            result = await synthesize(text, speaker, priority)
+            if on_chunk:
+                await on_chunk(result)
+            return result
+        if on_chunk:
+            tasks = [
+                asyncio.ensure_future(synthesize(chunk, speaker, priority))
+                for chunk in chunks
+            ]
+            consumed = 0
+            try:
+                for task in tasks:
+                    result = await task
+                    consumed += 1
+                    await on_chunk(result)
+            finally:
+                # Ещё не отправленные куски: ждущие отменяются, готовые удаляют свои временные файлы
+                for task in tasks[consumed:]:
+                    if task.cancel() or task.cancelled() or task.exception() is not None:
+                        continue
+                    task.result().cleanup()
+            return None
+        if TTS_BACKEND == "broker":
+            # Воркер сам делит и склеивает текст (synthesize_full)
+            return await synthesize(text, speaker, priority)
+        await wait_ready(get_speaker_lang(speaker))
+        audios = await asyncio.gather(*[
+            tts_queue.run_in_executor(synthesize_raw, chunk, speaker) for chunk in chunks
+        ])
+        return await tts_queue.run_in_executor(join_and_encode, audios, speaker)
+
+    return await tts_queue.run(
+        job, user_id=user_id, notify_func=notify_func, chars=len(text), priority=priority
+    )
@@ -1,10 +1,16 @@
-import sqlite3
+from collections import Counter
 from pathlib import Path
+from services.storage import Database
+from services.event_buffer import EventBuffer
+from utils.metrics import ANALYTICS_BUFFERED, ANALYTICS_DROPPED
+from config import ANALYTICS_BUFFER_SIZE, ANALYTICS_FLUSH_SECONDS, ANALYTICS_BUFFER_MAX_EVENTS, ANALYTICS_JOURNAL
 
 DB_FILE = Path("stats.db")
 
+db = Database(DB_FILE)
+
 def get_conn():
-    return sqlite3.connect(DB_FILE)
+    return db.transaction()
 
 def init_db():
     with get_conn() as conn:
@@ -36,6 +42,20 @@ def init_db():
             )
         """)
         conn.execute("CREATE INDEX IF NOT EXISTS idx_events_user_time ON events (user_id, timestamp)")
+        # Фильтры админки по действию и по времени; user_id в индексе, чтобы не ходить в таблицу при подсчётах
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_action_time ON events (action, timestamp, user_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_time ON events (timestamp)")
+        # Сводки событий по часам и дням, обновляются при каждой записи буфера
+        for table in ("events_hourly", "events_daily"):
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, action)
+                ) WITHOUT ROWID
+            """)
+        _backfill_rollups(conn)
         # Журнал ошибок
         conn.execute("""
             CREATE TABLE IF NOT EXISTS errors (
@@ -47,21 +67,78 @@ def init_db():
             )
         """)
         conn.execute("CREATE INDEX IF NOT EXISTS idx_errors_user_time ON errors (user_id, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_errors_time ON errors (timestamp)")
         # Заполнить глобальные счетчики если пусто
-        for key in ("total_users", "total_stt", "total_purchases", "total_recognitions_purchased"):
+        for key in ("total_users", "total_stt", "total_purchases", "total_recognitions_purchased",
+                    "tts_cache_hits", "tts_cache_misses"):
             cur = conn.execute("SELECT value FROM stats WHERE key=?", (key,))
             if cur.fetchone() is None:
                 conn.execute("INSERT INTO stats (key, value) VALUES (?, 0)", (key,))
+    # Дельты, не дошедшие до БД до падения прошлого запуска
+    restored = event_buffer.recover()
+    if restored:
+        print(f"Аналитика: восстановлено из журнала {restored} записей.")
+
+# Длина префикса ISO-времени: "2024-05-12T15" — час, "2024-05-12" — день
+ROLLUPS = {"hour": ("events_hourly", 13), "day": ("events_daily", 10)}
+
+def _backfill_rollups(conn):
+    """Заполняет пустые сводки по уже накопленным событиям (один раз после обновления)."""
+    for table, prefix in ROLLUPS.values():
+        if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None:
+            conn.execute(
+                f"INSERT INTO {table} (bucket, action, count) "
+                f"SELECT substr(timestamp, 1, {prefix}), action, COUNT(*) FROM events GROUP BY 1, 2"
+            )
+
+def _update_rollups(conn, events):
+    for table, prefix in ROLLUPS.values():
+        counts = Counter((timestamp[:prefix], action) for _, action, timestamp, _ in events)
+        conn.executemany(
+            f"INSERT INTO {table} (bucket, action, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (bucket, action) DO UPDATE SET count = count + excluded.count",
+            [(bucket, action, count) for (bucket, action), count in counts.items()]
+        )
+
+def _apply_buffer(events, stats, users):
+    """Записывает накопленные события и дельты счётчиков одной транзакцией."""
+    stats = dict(stats)
+    with get_conn() as conn:
+        if users:
+            cur = conn.executemany(
+                "INSERT OR IGNORE INTO users (user_id, stt_count, recognitions_purchased, registered_at, last_active, source) VALUES (?, 0, 0, ?, ?, NULL)",
+                [(user_id, delta[2], delta[2]) for user_id, delta in users.items()]
+            )
+            if cur.rowcount > 0:
+                stats["total_users"] = stats.get("total_users", 0) + cur.rowcount
+            conn.executemany(
+                "UPDATE users SET stt_count = stt_count + ?, recognitions_purchased = recognitions_purchased + ?, last_active=? WHERE user_id=?",
+                [(stt, purchased, last_active, user_id) for user_id, (stt, purchased, last_active) in users.items()]
+            )
+        if stats:
+            conn.executemany("UPDATE stats SET value = value + ? WHERE key=?", [(v, k) for k, v in stats.items()])
+        if events:
+            conn.executemany("INSERT INTO events (user_id, action, timestamp, details) VALUES (?, ?, ?, ?)", events)
+            _update_rollups(conn, events)
+
+# Горячие записи аналитики копятся в памяти и пишутся пачками (см. EventBuffer)
+event_buffer = EventBuffer(
+    _apply_buffer,
+    max_events=ANALYTICS_BUFFER_SIZE,
+    flush_interval=ANALYTICS_FLUSH_SECONDS,
+    max_pending=ANALYTICS_BUFFER_MAX_EVENTS,
+    journal_path=ANALYTICS_JOURNAL or None,
+)
+ANALYTICS_BUFFERED.set_function(event_buffer.pending)
+ANALYTICS_DROPPED.set_function(lambda: event_buffer.dropped)
+
+def flush_events():
+    return event_buffer.flush()
 
 def log_event(user_id, action, details=None):
     from datetime import datetime
     now = datetime.utcnow().isoformat()
-    with get_conn() as conn:
-        conn.execute(
-            "INSERT INTO events (user_id, action, timestamp, details) VALUES (?, ?, ?, ?)",
-            (str(user_id), action, now, details)
-        )
-        conn.commit()
+    event_buffer.add_event(user_id, action, now, details)
 
 def log_error(user_id, error_type, error_message):
     from datetime import datetime
@@ -71,7 +148,6 @@ def log_error(user_id, error_type, error_message):
             "INSERT INTO errors (user_id, error_type, error_message, timestamp) VALUES (?, ?, ?, ?)",
             (str(user_id), error_type, error_message, now)
         )
-        conn.commit()
 
 def get_stat(key):
     with get_conn() as conn:
@@ -84,21 +160,21 @@ def set_stat(key, value):
         conn.execute("UPDATE stats SET value=? WHERE key=?", (value, key))
 
 def inc_stat(key, amount=1):
-    with get_conn() as conn:
-        conn.execute("UPDATE stats SET value = value + ? WHERE key=?", (amount, key))
+    event_buffer.add_stat(key, amount)
 
-def register_user(user_id, source=None):
+def register_user(user_id, source=None, conn=None):
     from datetime import datetime
+    if conn is None:
+        with get_conn() as conn:
+            return register_user(user_id, source, conn)
     s_id = str(user_id)
     now = datetime.utcnow().isoformat()
-    with get_conn() as conn:
-        cur = conn.execute("SELECT 1 FROM users WHERE user_id=?", (s_id,))
-        if not cur.fetchone():
-            conn.execute(
-                "INSERT INTO users (user_id, stt_count, recognitions_purchased, registered_at, last_active, source) VALUES (?, 0, 0, ?, ?, ?)",
-                (s_id, now, now, source)
-            )
-            conn.execute("UPDATE stats SET value = value + 1 WHERE key='total_users'")
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO users (user_id, stt_count, recognitions_purchased, registered_at, last_active, source) VALUES (?, 0, 0, ?, ?, ?)",
+        (s_id, now, now, source)
+    )
+    if cur.rowcount:
+        conn.execute("UPDATE stats SET value = value + 1 WHERE key='total_users'")
 
 def update_last_active(user_id):
     from datetime import datetime
@@ -111,80 +187,92 @@ def increment_tts(user_id):
 
 def increment_stt(user_id):
     from datetime import datetime
-    s_id = str(user_id)
-    register_user(s_id)
     now = datetime.utcnow().isoformat()
-    with get_conn() as conn:
-        conn.execute("UPDATE stats SET value = value + 1 WHERE key='total_stt'")
-        conn.execute("UPDATE users SET stt_count = stt_count + 1, last_active=? WHERE user_id=?", (now, s_id))
-        conn.execute(
-            "INSERT INTO events (user_id, action, timestamp, details) VALUES (?, ?, ?, ?)",
-            (s_id, "stt", now, None)
-        )
+    event_buffer.add(event=(user_id, "stt", now, None), stats={"total_stt": 1}, user=(user_id, now, 1, 0))
 
 def increment_purchase(user_id, amount, details=None):
     from datetime import datetime
-    s_id = str(user_id)
-    register_user(s_id)
     now = datetime.utcnow().isoformat()
-    with get_conn() as conn:
-        conn.execute("UPDATE stats SET value = value + 1 WHERE key='total_purchases'")
-        conn.execute("UPDATE stats SET value = value + ? WHERE key='total_recognitions_purchased'", (amount,))
-        conn.execute("UPDATE users SET recognitions_purchased = recognitions_purchased + ?, last_active=? WHERE user_id=?", (amount, now, s_id))
-        conn.execute(
-            "INSERT INTO events (user_id, action, timestamp, details) VALUES (?, ?, ?, ?)",
-            (s_id, "purchase", now, details)
-        )
+    event_buffer.add(
+        event=(user_id, "purchase", now, details),
+        stats={"total_purchases": 1, "total_recognitions_purchased": amount},
+        user=(user_id, now, 0, amount),
+    )
 
 def get_stats():
+    """Глобальные счётчики. Пользователей выгружать через iter_users/get_users_page."""
+    flush_events()
     with get_conn() as conn:
-        stats = {
-            "total_users": get_stat("total_users"),
-            "total_stt": get_stat("total_stt"),
-            "total_purchases": get_stat("total_purchases"),
-            "total_recognitions_purchased": get_stat("total_recognitions_purchased"),
-            "users": {}
-        }
-        cur = conn.execute("SELECT user_id, stt_count, recognitions_purchased, registered_at, last_active, source FROM users")
-        for row in cur.fetchall():
-            stats["users"][row[0]] = {
-                "stt_count": row[1],
-                "recognitions_purchased": row[2],
-                "registered_at": row[3],
-                "last_active": row[4],
-                "source": row[5]
-            }
-        return stats
+        return dict(conn.execute("SELECT key, value FROM stats").fetchall())
 
-def get_events(user_id=None, action=None, since=None, limit=100):
-    query = "SELECT user_id, action, timestamp, details FROM events WHERE 1=1"
+USER_FIELDS = ("user_id", "stt_count", "recognitions_purchased", "registered_at", "last_active", "source")
+
+def get_users_page(after=None, limit=1000):
+    """
+    Страница пользователей по возрастанию user_id (постраничная навигация по ключу,
+    без OFFSET). Возвращает (список словарей, курсор для следующей страницы или None).
+    """
+    query = f"SELECT {', '.join(USER_FIELDS)} FROM users"
     params = []
-    if user_id:
-        query += " AND user_id=?"
-        params.append(str(user_id))
+    if after is not None:
+        query += " WHERE user_id > ?"
+        params.append(str(after))
+    query += " ORDER BY user_id LIMIT ?"
+    params.append(limit)
+    with get_conn() as conn:
+        rows = conn.execute(query, params).fetchall()
+    users = [dict(zip(USER_FIELDS, row)) for row in rows]
+    return users, (rows[-1][0] if len(rows) == limit else None)
+
+def iter_users(batch_size=1000):
+    """Все пользователи постранично: в памяти не больше одной страницы."""
+    flush_events()
+    cursor = None
+    while True:
+        users, cursor = get_users_page(cursor, batch_size)
+        yield from users
+        if cursor is None:
+            return
+
+def get_rollup(period="day", action=None, since=None, until=None):
+    """Число событий по часам ("hour") или дням ("day"): список (период, действие, количество)."""
+    flush_events()
+    table, prefix = ROLLUPS[period]
+    conditions, params = [], []
     if action:
-        query += " AND action=?"
+        conditions.append("action=?")
         params.append(action)
     if since:
-        query += " AND timestamp>=?"
-        params.append(since)
-    query += " ORDER BY timestamp DESC LIMIT ?"
-    params.append(limit)
+        conditions.append("bucket>=?")
+        params.append(since[:prefix])
+    if until:
+        conditions.append("bucket<=?")
+        params.append(until[:prefix])
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
     with get_conn() as conn:
-        cur = conn.execute(query, tuple(params))
-        return cur.fetchall()
+        return conn.execute(f"SELECT bucket, action, count FROM {table}{where} ORDER BY bucket, action", params).fetchall()
 
-def get_errors(user_id=None, since=None, limit=100):
-    query = "SELECT user_id, error_type, error_message, timestamp FROM errors WHERE 1=1"
-    params = []
-    if user_id:
-        query += " AND user_id=?"
-        params.append(str(user_id))
-    if since:
-        query += " AND timestamp>=?"
-        params.append(since)
+def _filtered(query, filters, limit):
+    conditions = [condition for condition, value in filters if value]
+    params = [value for condition, value in filters if value]
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
     query += " ORDER BY timestamp DESC LIMIT ?"
     params.append(limit)
     with get_conn() as conn:
-        cur = conn.execute(query, tuple(params))
-        return cur.fetchall()
\ No newline at end of file
+        return conn.execute(query, params).fetchall()
+
+def get_events(user_id=None, action=None, since=None, limit=100):
+    flush_events()
+    return _filtered(
+        "SELECT user_id, action, timestamp, details FROM events",
+        [("user_id=?", str(user_id) if user_id else None), ("action=?", action), ("timestamp>=?", since)],
+        limit
+    )
+
+def get_errors(user_id=None, since=None, limit=100):
+    return _filtered(
+        "SELECT user_id, error_type, error_message, timestamp FROM errors",
+        [("user_id=?", str(user_id) if user_id else None), ("timestamp>=?", since)],
+        limit
+    )
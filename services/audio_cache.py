@@ -0,0 +1,124 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB
+
+AUDIO_SUFFIX = ".audio"
+FILE_ID_SUFFIX = ".fid"
+
+def make_key(text, speaker, sample_rate, model_version, fmt="wav", variant=""):
+    """
+    Ключ кэша: хэш нормализованного текста, голоса, частоты, версии модели и формата.
+    variant — прочие настройки, влияющие на звук (точность модели, склейка кусков).
+    """
+    raw = "\x1f".join((str(model_version), str(speaker), str(sample_rate), fmt, variant, text))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class AudioCache:
+    """
+    Кэш готовых аудио на диске с вытеснением давно не использованных записей (LRU)
+    по суммарному размеру. Для каждой записи хранится Telegram file_id, чтобы
+    повторная отправка шла без загрузки файла.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> размер файла
+        self.file_ids = {}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self._load_index()
+
+    def _audio_path(self, key):
+        return self.dir / f"{key}{AUDIO_SUFFIX}"
+
+    def _file_id_path(self, key):
+        return self.dir / f"{key}{FILE_ID_SUFFIX}"
+
+    def _load_index(self):
+        # Порядок LRU восстанавливается по mtime (он обновляется при каждом попадании)
+        files = sorted(self.dir.glob(f"*{AUDIO_SUFFIX}"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            key = path.name[:-len(AUDIO_SUFFIX)]
+            size = path.stat().st_size
+            self.entries[key] = size
+            self.total_bytes += size
+            fid_path = self._file_id_path(key)
+            if fid_path.exists():
+                self.file_ids[key] = fid_path.read_text(encoding="utf-8").strip()
+        self._evict()
+
+    def get(self, key):
+        """Возвращает (путь к файлу, file_id) или (None, None), если записи нет."""
+        with self.lock:
+            if key not in self.entries:
+                return None, None
+            self.entries.move_to_end(key)
+            path = self._audio_path(key)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self._drop(key)
+                return None, None
+            return path, self.file_ids.get(key)
+
+    def _tmp_path(self, path):
+        return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def put(self, key, data: bytes):
+        path = self._audio_path(key)
+        tmp_path = self._tmp_path(path)
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self._register(key, len(data))
+
+    def put_file(self, key, src_path):
+        """Кладёт в кэш копию уже записанного файла, не читая его в память."""
+        path = self._audio_path(key)
+        tmp_path = self._tmp_path(path)
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        self._register(key, path.stat().st_size)
+
+    def _register(self, key, size):
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries[key]
+            self.entries[key] = size
+            self.entries.move_to_end(key)
+            self.total_bytes += size
+            self._evict()
+
+    def set_file_id(self, key, file_id):
+        with self.lock:
+            if key not in self.entries:
+                return
+            self.file_ids[key] = file_id
+        self._file_id_path(key).write_text(file_id, encoding="utf-8")
+
+    def _drop(self, key):
+        size = self.entries.pop(key, 0)
+        self.total_bytes -= size
+        self.file_ids.pop(key, None)
+        for path in (self._audio_path(key), self._file_id_path(key)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            oldest = next(iter(self.entries))
+            self._drop(oldest)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+# Глобальный экземпляр кэша
+audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024)
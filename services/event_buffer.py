@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from services.storage import run_db
+
+class EventBuffer:
+    """
+    Буфер аналитики с отложенной записью: события копятся в памяти, а счётчики
+    складываются в дельты. apply(events, stat_deltas, user_deltas) записывает всё
+    одной транзакцией по таймеру или, при заполнении буфера, в фоновой задаче
+    (вызывающий код не ждёт записи и не получает её ошибок).
+
+    Гарантия — «хотя бы один раз»: каждое добавление до возврата дописывается в
+    журнал на диске (journal_path.N, с fsync). При сбросе буфер переходит на
+    следующий сегмент журнала, а записанные сегменты удаляются только после
+    успешной транзакции; если запись упала, данные возвращаются в буфер.
+    recover() при старте дописывает в БД всё из оставшихся сегментов — если
+    процесс упал между транзакцией и удалением сегмента, эти дельты учтутся
+    дважды. Пока БД недоступна, в памяти хранится не больше max_pending событий —
+    старые отбрасываются и считаются в dropped; дельты счётчиков компактны и не
+    отбрасываются. Без journal_path буфер только в памяти и теряет при падении
+    то, что не успело сброситься.
+    """
+
+    def __init__(self, apply, max_events: int = 1000, flush_interval: float = 2.0, max_pending: int = 0,
+                 journal_path=None):
+        self.apply = apply
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending or max_events * 10
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.events = []
+        self.stats = defaultdict(int)
+        self.users = {}  # user_id -> [stt_count, recognitions_purchased, last_active]
+        self.dropped = 0
+        self.flush_requested = False
+        # После неудачной записи досрочные сбросы не пробуются до следующего периода
+        self.retry_at = 0.0
+        self.task = None
+        self.loop = None
+        self.wakeup = None
+        self.journal_path = journal_path
+        self.journal = None
+        self.segment = 0
+
+    def add(self, event=None, stats=None, user=None):
+        """
+        Одно действие целиком (событие, дельты счётчиков, дельта пользователя) —
+        одна запись журнала и один fsync.
+        event: (user_id, action, timestamp, details); user: (user_id, timestamp, stt_count, recognitions_purchased).
+        """
+        record = {}
+        if event:
+            record["e"] = [str(event[0]), *event[1:]]
+        if stats:
+            record["s"] = stats
+        if user:
+            record["u"] = [str(user[0]), *user[1:]]
+        with self.lock:
+            self._write_journal(record)
+            self._apply_record(record)
+            full = (len(self.events) >= self.max_events and not self.flush_requested
+                    and time.monotonic() >= self.retry_at)
+            if full:
+                self.flush_requested = True
+        if full:
+            self._request_flush()
+
+    def add_event(self, user_id, action, timestamp, details=None):
+        self.add(event=(user_id, action, timestamp, details))
+
+    def add_stat(self, key, amount=1):
+        self.add(stats={key: amount})
+
+    def add_user(self, user_id, timestamp, stt_count=0, recognitions_purchased=0):
+        self.add(user=(user_id, timestamp, stt_count, recognitions_purchased))
+
+    def _apply_record(self, record):
+        if "e" in record:
+            self.events.append(tuple(record["e"]))
+            self._trim()
+        for key, amount in record.get("s", {}).items():
+            self.stats[key] += amount
+        if "u" in record:
+            user_id, timestamp, stt_count, recognitions_purchased = record["u"]
+            delta = self.users.setdefault(user_id, [0, 0, timestamp])
+            delta[0] += stt_count
+            delta[1] += recognitions_purchased
+            delta[2] = max(delta[2], timestamp)
+
+    def _segment_path(self, number):
+        return Path(f"{self.journal_path}.{number}")
+
+    def _segments(self):
+        """Номера сегментов журнала на диске по возрастанию."""
+        path = Path(self.journal_path)
+        numbers = []
+        for file in path.parent.glob(f"{path.name}.*"):
+            suffix = file.name[len(path.name) + 1:]
+            if suffix.isdigit():
+                numbers.append(int(suffix))
+        return sorted(numbers)
+
+    def _write_journal(self, record):
+        if not self.journal_path:
+            return
+        if self.journal is None:
+            self.journal = open(self._segment_path(self.segment), "a", encoding="utf-8")
+        self.journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def _rotate(self):
+        """Закрывает текущий сегмент журнала; возвращает его номер (всё до него входит в сброс)."""
+        if not self.journal_path:
+            return None
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        closed = self.segment
+        self.segment += 1
+        return closed
+
+    def _remove_segments(self, upto):
+        for number in self._segments():
+            if number <= upto:
+                self._segment_path(number).unlink(missing_ok=True)
+
+    def recover(self):
+        """
+        Загружает в буфер записи из сегментов журнала, оставшихся после прошлого
+        запуска, и сбрасывает их в БД. Вызывается при старте до приёма событий.
+        Возвращает число восстановленных записей.
+        """
+        if not self.journal_path:
+            return 0
+        Path(self.journal_path).parent.mkdir(parents=True, exist_ok=True)
+        numbers = self._segments()
+        restored = 0
+        with self.lock:
+            for number in numbers:
+                with open(self._segment_path(number), encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # Недописанная последняя строка: fsync не завершился, добавление не подтверждено
+                            continue
+                        self._apply_record(record)
+                        restored += 1
+            self.segment = max(numbers, default=-1) + 1
+        if restored:
+            self.try_flush()
+        else:
+            self._remove_segments(self.segment - 1)
+        return restored
+
+    def _trim(self):
+        excess = len(self.events) - self.max_pending
+        if excess > 0:
+            del self.events[:excess]
+            self.dropped += excess
+
+    def _request_flush(self):
+        # add_event вызывается из потока БД: фоновая задача будится через её event loop
+        if self.task is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        else:
+            self.try_flush()
+
+    def _take(self):
+        with self.lock:
+            batch = (self.events, dict(self.stats), self.users)
+            self.events, self.stats, self.users = [], defaultdict(int), {}
+            self.flush_requested = False
+            return batch, self._rotate()
+
+    def _restore(self, events, stats, users):
+        with self.lock:
+            self.events[:0] = events
+            self._trim()
+            for key, amount in stats.items():
+                self.stats[key] += amount
+            for user_id, (stt_count, purchased, last_active) in users.items():
+                delta = self.users.setdefault(user_id, [0, 0, last_active])
+                delta[0] += stt_count
+                delta[1] += purchased
+                delta[2] = max(delta[2], last_active)
+            self.retry_at = time.monotonic() + self.flush_interval
+
+    def flush(self):
+        with self.flush_lock:
+            (events, stats, users), segment = self._take()
+            if not (events or stats or users):
+                return 0
+            try:
+                self.apply(events, stats, users)
+            except Exception:
+                # Сегменты журнала остаются на диске и удалятся после следующего успешного сброса
+                self._restore(events, stats, users)
+                raise
+            if segment is not None:
+                self._remove_segments(segment)
+            return len(events)
+
+    def try_flush(self):
+        """flush без исключений: ошибка только логируется."""
+        try:
+            return self.flush()
+        except Exception as e:
+            print("Analytics flush error:", e)
+            return 0
+
+    def pending(self):
+        with self.lock:
+            return len(self.events)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await run_db(self.try_flush)
+
+    def start(self):
+        if self.task is None:
+            self.loop = asyncio.get_running_loop()
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await run_db(self.flush)
+        with self.lock:
+            self._rotate()
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import time
+from services.storage import Database, run_db
+from services.tts_queue import QueueRejected
+from config import (
+    TTS_BROKER_DB, TTS_BROKER_JOB_TIMEOUT, TTS_BROKER_MAX_ATTEMPTS, TTS_BROKER_MAX_PENDING, TTS_BROKER_POLL_MS
+)
+
+class JobFailed(Exception):
+    pass
+
+class JobBroker:
+    """
+    Очередь задач синтеза в SQLite, общая для бота и воркеров (python worker.py).
+    Воркер забирает задачу атомарным UPDATE ... RETURNING и держит её не дольше
+    job_timeout; просроченные и упавшие задачи возвращаются в очередь, пока не
+    исчерпаны max_attempts. Бот забирает готовые результаты и удаляет строки.
+    """
+
+    def __init__(self, path, job_timeout=60, max_attempts=3, max_pending=0):
+        self.db = Database(path)
+        self.job_timeout = job_timeout
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+
+    def init(self):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tts_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'done', 'failed'
+                    lang TEXT NOT NULL,
+                    speaker TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    lease_until REAL,
+                    worker TEXT,
+                    result_data BLOB,
+                    result_path TEXT,
+                    filename TEXT,
+                    error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON tts_jobs (status, priority DESC, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lease ON tts_jobs (status, lease_until)")
+
+    def submit(self, lang, speaker, text, priority=0):
+        with self.db.transaction() as conn:
+            if self.max_pending:
+                pending = conn.execute("SELECT COUNT(*) FROM tts_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueRejected("overloaded", retry_after=int(self.job_timeout))
+            cur = conn.execute(
+                "INSERT INTO tts_jobs (lang, speaker, text, priority, created_at) VALUES (?, ?, ?, ?, ?)",
+                (lang, speaker, text, priority, time.time())
+            )
+            return cur.lastrowid
+
+    def claim(self, worker, langs=None):
+        """Забирает следующую задачу (для воркера). Возвращает (id, speaker, text) или None."""
+        lang_filter = f"AND lang IN ({','.join('?' * len(langs))})" if langs else ""
+        with self.db.transaction() as conn:
+            row = conn.execute(f"""
+                UPDATE tts_jobs SET status='running', worker=?, lease_until=?, attempts=attempts + 1
+                WHERE id = (
+                    SELECT id FROM tts_jobs WHERE status='queued' {lang_filter}
+                    ORDER BY priority DESC, id LIMIT 1
+                )
+                RETURNING id, speaker, text
+            """, (worker, time.time() + self.job_timeout, *(langs or ()))).fetchone()
+        return row
+
+    def complete(self, job_id, worker, data=None, path=None, filename=None):
+        # Задачу могли отменить или отдать другому воркеру — тогда результат не нужен
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                """UPDATE tts_jobs SET status='done', result_data=?, result_path=?, filename=?, lease_until=NULL
+                   WHERE id=? AND status='running' AND worker=?""",
+                (data, path, filename, job_id, worker)
+            )
+            return cur.rowcount > 0
+
+    def fail(self, job_id, worker, error):
+        with self.db.transaction() as conn:
+            conn.execute(
+                """UPDATE tts_jobs SET status=CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END,
+                       error=?, worker=NULL, lease_until=NULL
+                   WHERE id=? AND status='running' AND worker=?""",
+                (self.max_attempts, str(error)[:500], job_id, worker)
+            )
+
+    def requeue_expired(self):
+        """Возвращает в очередь задачи зависших или упавших воркеров."""
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                """UPDATE tts_jobs SET status=CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END,
+                       error='timeout', worker=NULL, lease_until=NULL
+                   WHERE status='running' AND lease_until < ?""",
+                (self.max_attempts, time.time())
+            )
+            return cur.rowcount
+
+    def collect(self, job_ids):
+        """Готовые и окончательно упавшие задачи из job_ids; их строки удаляются."""
+        if not job_ids:
+            return []
+        placeholders = ",".join("?" * len(job_ids))
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                f"""SELECT id, status, result_data, result_path, filename, error FROM tts_jobs
+                    WHERE id IN ({placeholders}) AND status IN ('done', 'failed')""",
+                job_ids
+            ).fetchall()
+            if rows:
+                conn.executemany("DELETE FROM tts_jobs WHERE id=?", [(row[0],) for row in rows])
+        return rows
+
+    def cancel(self, job_id):
+        self._delete("id=?", (job_id,))
+
+    def purge_stale(self, max_age):
+        """
+        Удаляет задачи старше max_age секунд: их уже никто не ждёт (бот отменился
+        или перезапустился), а строка держит результат. Возвращает число удалённых.
+        """
+        return self._delete("created_at < ?", (time.time() - max_age,))
+
+    def _delete(self, condition, params):
+        with self.db.transaction() as conn:
+            rows = conn.execute(f"SELECT id, result_path FROM tts_jobs WHERE {condition}", params).fetchall()
+            if rows:
+                conn.executemany("DELETE FROM tts_jobs WHERE id=?", [(row[0],) for row in rows])
+        # Файлы — после коммита: строки без файла не бывает, а файл без строки уже никто не заберёт
+        for _, path in rows:
+            if path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return len(rows)
+
+    def stats(self):
+        with self.db.transaction() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM tts_jobs GROUP BY status").fetchall())
+
+class BrokerClient:
+    """
+    Сторона бота: отправляет задачи в брокер и ждёт результаты. Один фоновый
+    опрос на все ожидающие задачи; он же возвращает в очередь просроченные.
+    """
+
+    def __init__(self, broker, poll_interval=0.05, wait_timeout=None):
+        self.broker = broker
+        self.poll_interval = poll_interval
+        # Общее время ожидания с учётом повторов
+        self.wait_timeout = wait_timeout or broker.job_timeout * broker.max_attempts + 10
+        self.pending = {}
+        self.task = None
+
+    async def synthesize(self, lang, speaker, text, priority=0):
+        job_id = await run_db(self.broker.submit, lang, speaker, text, priority)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[job_id] = future
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._poll())
+        try:
+            return await asyncio.wait_for(future, self.wait_timeout)
+        except asyncio.TimeoutError:
+            await run_db(self.broker.cancel, job_id)
+            raise JobFailed(f"задача {job_id} не выполнена за {self.wait_timeout:.0f} с.")
+        except asyncio.CancelledError:
+            # Обработчик отменён (остановка бота): задача и её результат больше не нужны
+            await run_db(self.broker.cancel, job_id)
+            raise
+        finally:
+            self.pending.pop(job_id, None)
+
+    def purge_stale(self):
+        """Строки, которые уже никто не заберёт: старше общего ожидания с запасом на одну аренду."""
+        return self.broker.purge_stale(self.wait_timeout + self.broker.job_timeout)
+
+    async def _poll(self):
+        last_requeue = time.monotonic()
+        while self.pending:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if time.monotonic() - last_requeue > self.broker.job_timeout / 4:
+                    last_requeue = time.monotonic()
+                    await run_db(self.broker.requeue_expired)
+                    await run_db(self.purge_stale)
+                rows = await run_db(self.broker.collect, list(self.pending))
+            except Exception as e:
+                print("Broker poll error:", e)
+                continue
+            for job_id, status, data, path, filename, error in rows:
+                future = self.pending.get(job_id)
+                if future is None or future.done():
+                    continue
+                if status == "done":
+                    future.set_result((data, path, filename))
+                else:
+                    future.set_exception(JobFailed(error or "ошибка синтеза"))
+
+# Общая очередь задач (используется при TTS_BACKEND=broker)
+job_broker = JobBroker(
+    TTS_BROKER_DB,
+    job_timeout=TTS_BROKER_JOB_TIMEOUT,
+    max_attempts=TTS_BROKER_MAX_ATTEMPTS,
+    max_pending=TTS_BROKER_MAX_PENDING,
+)
+broker_client = BrokerClient(job_broker, poll_interval=TTS_BROKER_POLL_MS / 1000)
@@ -0,0 +1,208 @@
+"""
+Обслуживание БД: сроки хранения журналов, архивы и возврат свободного места.
+Фоновый цикл run_maintenance запускает main.py; разовые операции — из консоли:
+
+    python -m services.maintenance enable-incremental-vacuum   # один раз, бот остановлен
+    python -m services.maintenance run                         # один проход очистки
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from services.storage import run_db
+from services import analytics_db, user_limits_db
+from config import (
+    RETENTION_EVENTS_DAYS, RETENTION_ERRORS_DAYS, RETENTION_HISTORY_DAYS, ARCHIVE_DIR,
+    MAINTENANCE_INTERVAL_MINUTES, MAINTENANCE_CHUNK_ROWS
+)
+
+# Пауза между порциями, чтобы запросы бота успевали проходить через поток БД
+CHUNK_PAUSE = 0.05
+VACUUM_PAGES = 256
+
+class RetentionPolicy:
+    """
+    Срок хранения одной таблицы журнала. Строки старше days выгружаются в месячный
+    архив gzip JSONL, при необходимости складываются в дневную сводку rollup
+    (группа, сумма) и удаляются порциями по chunk_rows — каждая порция короткая
+    отдельная транзакция.
+    """
+
+    def __init__(self, database, table, columns, days, rollup=None, chunk_rows=500):
+        self.db = database
+        self.table = table
+        self.columns = columns
+        self.days = days
+        self.rollup = rollup  # (таблица сводки, колонка группы, колонка суммы или None)
+        self.chunk_rows = chunk_rows
+
+    def init_rollup(self):
+        if not self.rollup:
+            return
+        table, group_column, sum_column = self.rollup
+        amount = ", amount INTEGER NOT NULL DEFAULT 0" if sum_column else ""
+        with self.db.transaction() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT NOT NULL,
+                    {group_column} TEXT NOT NULL,
+                    count INTEGER NOT NULL{amount},
+                    PRIMARY KEY (bucket, {group_column})
+                ) WITHOUT ROWID
+            """)
+
+    def cutoff(self):
+        return (datetime.utcnow() - timedelta(days=self.days)).isoformat()
+
+    def fetch_chunk(self, cutoff):
+        with self.db.transaction() as conn:
+            return conn.execute(
+                f"SELECT id, {', '.join(self.columns)} FROM {self.table} WHERE timestamp < ? ORDER BY id LIMIT ?",
+                (cutoff, self.chunk_rows)
+            ).fetchall()
+
+    def archive(self, rows, archive_dir):
+        """Дописывает строки в архивы по месяцам (каждая дозапись — отдельный gzip-член)."""
+        by_month = defaultdict(list)
+        timestamp_index = self.columns.index("timestamp") + 1
+        for row in rows:
+            by_month[row[timestamp_index][:7]].append(row)
+        for month, month_rows in by_month.items():
+            path = Path(archive_dir) / f"{Path(self.db.path).stem}_{self.table}_{month}.jsonl.gz"
+            lines = "".join(
+                json.dumps(dict(zip(("id",) + self.columns, row)), ensure_ascii=False) + "\n"
+                for row in month_rows
+            )
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write(lines)
+
+    def delete_chunk(self, rows):
+        with self.db.transaction() as conn:
+            if self.rollup:
+                self._roll_up(conn, rows)
+            conn.executemany(f"DELETE FROM {self.table} WHERE id=?", [(row[0],) for row in rows])
+
+    def _roll_up(self, conn, rows):
+        table, group_column, sum_column = self.rollup
+        timestamp_index = self.columns.index("timestamp") + 1
+        group_index = self.columns.index(group_column) + 1
+        counts = Counter()
+        amounts = Counter()
+        for row in rows:
+            key = (row[timestamp_index][:10], row[group_index] or "")
+            counts[key] += 1
+            if sum_column:
+                amounts[key] += row[self.columns.index(sum_column) + 1] or 0
+        if sum_column:
+            conn.executemany(
+                f"INSERT INTO {table} (bucket, {group_column}, count, amount) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT (bucket, {group_column}) DO UPDATE SET "
+                "count = count + excluded.count, amount = amount + excluded.amount",
+                [(bucket, group, count, amounts[(bucket, group)]) for (bucket, group), count in counts.items()]
+            )
+        else:
+            conn.executemany(
+                f"INSERT INTO {table} (bucket, {group_column}, count) VALUES (?, ?, ?) "
+                f"ON CONFLICT (bucket, {group_column}) DO UPDATE SET count = count + excluded.count",
+                [(bucket, group, count) for (bucket, group), count in counts.items()]
+            )
+
+    async def run(self, archive_dir=ARCHIVE_DIR):
+        """Обрабатывает все просроченные строки. Архив пишется до удаления (возможны повторы, но не потери)."""
+        if not self.days:
+            return 0
+        cutoff = self.cutoff()
+        total = 0
+        while True:
+            rows = await run_db(self.fetch_chunk, cutoff)
+            if not rows:
+                return total
+            if archive_dir:
+                await asyncio.to_thread(self.archive, rows, archive_dir)
+            await run_db(self.delete_chunk, rows)
+            total += len(rows)
+            await asyncio.sleep(CHUNK_PAUSE)
+
+RETENTION_POLICIES = [
+    # События уже сведены в events_daily/events_hourly при записи
+    RetentionPolicy(analytics_db.db, "events", ("user_id", "action", "timestamp", "details"),
+                    RETENTION_EVENTS_DAYS, chunk_rows=MAINTENANCE_CHUNK_ROWS),
+    RetentionPolicy(analytics_db.db, "errors", ("user_id", "error_type", "error_message", "timestamp"),
+                    RETENTION_ERRORS_DAYS, rollup=("errors_daily", "error_type", None),
+                    chunk_rows=MAINTENANCE_CHUNK_ROWS),
+    RetentionPolicy(user_limits_db.db, "user_limit_history", ("user_id", "action", "amount", "timestamp", "comment"),
+                    RETENTION_HISTORY_DAYS, rollup=("user_limit_history_daily", "action", "amount"),
+                    chunk_rows=MAINTENANCE_CHUNK_ROWS),
+]
+
+DATABASES = (analytics_db.db, user_limits_db.db)
+
+def init_maintenance():
+    """Создаёт таблицы сводок (вызывается до старта бота). Режим VACUUM не меняет."""
+    if ARCHIVE_DIR:
+        Path(ARCHIVE_DIR).mkdir(parents=True, exist_ok=True)
+    for policy in RETENTION_POLICIES:
+        policy.init_rollup()
+    for database in DATABASES:
+        if database.auto_vacuum() != 2:
+            print(f"{database.path}: инкрементальный VACUUM выключен, место после очистки не возвращается ОС. "
+                  "Включить: python -m services.maintenance enable-incremental-vacuum")
+
+async def vacuum(database):
+    # Без auto_vacuum=INCREMENTAL прагма ничего не делает, а свободные страницы так и остаются
+    if await run_db(database.auto_vacuum) != 2:
+        return
+    # Свободные страницы возвращаются небольшими порциями между запросами бота
+    while await run_db(database.incremental_vacuum, VACUUM_PAGES):
+        await asyncio.sleep(CHUNK_PAUSE)
+
+async def run_maintenance_once():
+    started = time.monotonic()
+    removed = {}
+    for policy in RETENTION_POLICIES:
+        removed[policy.table] = await policy.run()
+    for database in DATABASES:
+        await vacuum(database)
+    if any(removed.values()):
+        print(f"Обслуживание БД: удалено {removed} за {time.monotonic() - started:.1f} с.")
+    return removed
+
+async def run_maintenance(interval=MAINTENANCE_INTERVAL_MINUTES * 60):
+    while True:
+        try:
+            await run_maintenance_once()
+        except Exception as e:
+            print("Maintenance error:", e)
+        await asyncio.sleep(interval)
+
+def enable_incremental_vacuum():
+    """Разовая миграция: переводит обе БД в auto_vacuum=INCREMENTAL полным VACUUM."""
+    for database in DATABASES:
+        started = time.monotonic()
+        if database.enable_incremental_vacuum():
+            print(f"{database.path}: инкрементальный VACUUM включён за {time.monotonic() - started:.1f} с.")
+        else:
+            print(f"{database.path}: уже включён.")
+        database.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание БД бота")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("enable-incremental-vacuum", help="разово включить инкрементальный VACUUM (полный VACUUM файла)")
+    commands.add_parser("run", help="один проход очистки по срокам хранения")
+    args = parser.parse_args()
+
+    if args.command == "enable-incremental-vacuum":
+        enable_incremental_vacuum()
+    else:
+        analytics_db.init_db()
+        user_limits_db.init_db()
+        init_maintenance()
+        asyncio.run(run_maintenance_once())
+
+if __name__ == "__main__":
+    main()
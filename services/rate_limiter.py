@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from config import RATE_LIMITS, MAX_QUEUED_SYNTH_SECONDS, RATE_LIMIT_STATE_FILE
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    """
+    Антифлуд в памяти: token bucket на пользователя (O(1) на проверку, без БД)
+    и общий лимит секунд синтеза в очереди. Параметры корзины зависят от тарифа:
+    tiers = {"free": (ёмкость, секунд на один токен), "paid": (...)}.
+    Время — монотонные часы; на диск состояние сохраняется по желанию (save/load).
+    """
+
+    def __init__(self, tiers, max_queued_seconds=0, idle_seconds=3600, state_file=None):
+        self.tiers = tiers
+        self.max_queued_seconds = max_queued_seconds
+        self.idle_seconds = idle_seconds
+        self.state_file = Path(state_file) if state_file else None
+        self.buckets = {}
+        self.queued_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, bucket, capacity, period, now):
+        bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) / period)
+        bucket.updated = now
+
+    def check(self, user_id, tier="free"):
+        """Списывает токен. Возвращает (разрешено, секунд до следующей попытки)."""
+        capacity, period = self.tiers.get(tier, self.tiers["free"])
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(user_id)
+            if bucket is None:
+                bucket = self.buckets[user_id] = TokenBucket(capacity, now)
+            else:
+                self._refill(bucket, capacity, period, now)
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return True, 0
+            return False, max(int((1 - bucket.tokens) * period + 0.999), 1)
+
+    def refund(self, user_id, tier="free"):
+        """Возвращает токен, если запрос отклонён по другой причине."""
+        capacity, _ = self.tiers.get(tier, self.tiers["free"])
+        with self.lock:
+            bucket = self.buckets.get(user_id)
+            if bucket is not None:
+                bucket.tokens = min(capacity, bucket.tokens + 1)
+
+    def reserve(self, seconds):
+        """Учитывает оценку длительности синтеза в общем лимите очереди."""
+        with self.lock:
+            if self.max_queued_seconds and self.queued_seconds + seconds > self.max_queued_seconds:
+                return False
+            self.queued_seconds += seconds
+            return True
+
+    def release(self, seconds):
+        with self.lock:
+            self.queued_seconds = max(self.queued_seconds - seconds, 0.0)
+
+    def prune(self):
+        """Удаляет давно неактивных пользователей (их корзины уже полные)."""
+        deadline = time.monotonic() - self.idle_seconds
+        with self.lock:
+            idle = [uid for uid, bucket in self.buckets.items() if bucket.updated < deadline]
+            for uid in idle:
+                del self.buckets[uid]
+        return len(idle)
+
+    def save(self):
+        if not self.state_file:
+            return
+        # Монотонное время не переживает перезапуск — сохраняем возраст корзины
+        now = time.monotonic()
+        with self.lock:
+            state = {str(uid): [b.tokens, now - b.updated] for uid, b in self.buckets.items()}
+        self.state_file.write_text(json.dumps({"saved_at": time.time(), "buckets": state}), encoding="utf-8")
+
+    def load(self):
+        if not self.state_file or not self.state_file.exists():
+            return
+        try:
+            state = json.loads(self.state_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        now = time.monotonic()
+        downtime = max(time.time() - state.get("saved_at", time.time()), 0.0)
+        with self.lock:
+            for uid, (tokens, age) in state.get("buckets", {}).items():
+                self.buckets[int(uid) if uid.lstrip("-").isdigit() else uid] = TokenBucket(tokens, now - age - downtime)
+
+    async def run_pruning(self, interval=600):
+        while True:
+            await asyncio.sleep(interval)
+            self.prune()
+
+    def stats(self):
+        with self.lock:
+            return {"users": len(self.buckets), "queued_seconds": self.queued_seconds}
+
+# Глобальный антифлуд бота
+rate_limiter = RateLimiter(
+    RATE_LIMITS,
+    max_queued_seconds=MAX_QUEUED_SYNTH_SECONDS,
+    state_file=RATE_LIMIT_STATE_FILE or None,
+)
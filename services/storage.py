@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from utils.metrics import DB_SECONDS, ENABLED as METRICS_ENABLED
+
+# Вся работа с БД из асинхронных обработчиков идёт через один выделенный поток
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+class Database:
+    """
+    Долгоживущее соединение SQLite (WAL, synchronous=NORMAL, кэш подготовленных
+    запросов). transaction() допускает вложенность: коммит/откат делает только
+    внешний уровень.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.lock = threading.RLock()
+        self.depth = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        # Действует только для новой БД (до первой таблицы); существующую переводит
+        # python -m services.maintenance enable-incremental-vacuum
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self.conn is None:
+                self.conn = self._connect()
+            self.depth += 1
+            try:
+                yield self.conn
+            except BaseException:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.conn.rollback()
+                raise
+            self.depth -= 1
+            if self.depth == 0:
+                self.conn.commit()
+
+    def auto_vacuum(self):
+        """Режим auto_vacuum: 0 — выключен, 1 — FULL, 2 — INCREMENTAL."""
+        with self.transaction() as conn:
+            return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    def enable_incremental_vacuum(self):
+        """
+        Включает auto_vacuum=INCREMENTAL. Для существующего файла режим вступает
+        в силу только после полного VACUUM: он переписывает весь файл и держит
+        эксклюзивную блокировку, поэтому запускается отдельной командой
+        (python -m services.maintenance enable-incremental-vacuum). Возвращает
+        True, если режим пришлось переключать.
+        """
+        with self.transaction() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            return True
+
+    def incremental_vacuum(self, pages):
+        """Возвращает ОС до pages свободных страниц; возвращает, сколько свободных осталось."""
+        with self.transaction() as conn:
+            # Через execute() sqlite3 делает один шаг — освобождается одна страница; executescript доводит до конца
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию работы с БД в потоке БД, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    if not METRICS_ENABLED:
+        return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+    finally:
+        DB_SECONDS.observe(time.perf_counter() - started, getattr(func, "__name__", "call"))
@@ -1,42 +1,214 @@
 import asyncio
-from collections import deque
+import functools
+import itertools
+import time
+from collections import OrderedDict, deque
+from utils import metrics
+from config import (
+    TTS_WORKERS, SYNTH_SECONDS_PER_CHAR, TTS_MAX_WAIT_SECONDS, TTS_USER_MAX_QUEUED, TTS_PAID_WEIGHT,
+    TTS_BACKEND, TTS_BROKER_INFLIGHT
+)
+
+# Тарифы в порядке приоритета
+PRIORITIES = ("paid", "free")
+
+class QueueRejected(Exception):
+    """Запрос не принят в очередь: retry_after — через сколько секунд стоит повторить."""
+
+    def __init__(self, reason, retry_after=0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TTSJob:
+    __slots__ = ("seq", "future", "coro_func", "user_id", "notify_func", "chars", "priority", "enqueued")
+
+    def __init__(self, seq, future, coro_func, user_id, notify_func, chars, priority):
+        self.seq = seq
+        self.future = future
+        self.coro_func = coro_func
+        self.user_id = user_id
+        self.notify_func = notify_func
+        self.chars = chars
+        self.priority = priority
+        self.enqueued = time.monotonic()
 
 class TTSQueueManager:
-    def __init__(self, max_concurrent: int = 3):
-        self.semaphore = asyncio.Semaphore(max_concurrent)
-        self.queue = deque()
-        self.lock = asyncio.Lock()
+    """
+    Очередь синтеза с приоритетами. Платные задачи идут раньше бесплатных
+    (но не больше paid_weight подряд, пока ждут бесплатные), внутри тарифа
+    пользователи обслуживаются по кругу, и у каждого выполняется не больше
+    одной задачи. Время ожидания оценивается по скользящему среднему
+    секунд синтеза на символ.
+    """
+
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, max_concurrent: int = 3, executor_factory=None, max_wait_seconds=0,
+                 user_max_queued=3, paid_weight=3, seconds_per_char=0.01):
+        self.max_concurrent = max_concurrent
+        self.max_wait_seconds = max_wait_seconds
+        self.user_max_queued = user_max_queued
+        self.paid_weight = paid_weight
+        self.seconds_per_char = seconds_per_char
+        # тариф -> {user_id: deque(задач)}; порядок ключей задаёт очередь обхода
+        self.waiting = {priority: OrderedDict() for priority in PRIORITIES}
+        self.active_users = set()
+        self.running = 0
+        self.running_chars = 0
+        self.paid_streak = 0
+        self.seq = itertools.count()
+        # Пул, в котором выполняется синтез (создаётся при первом использовании)
+        self.executor_factory = executor_factory
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None and self.executor_factory is not None:
+            self.executor = self.executor_factory()
+        return self.executor
 
-    async def run(self, coro_func, user_id=None, notify_func=None):
-        future = asyncio.get_event_loop().create_future()
+    async def run_in_executor(self, func, *args, **kwargs):
+        """Выполняет синхронную функцию в пуле синтеза, не блокируя event loop."""
+        loop = asyncio.get_running_loop()
+        if not metrics.ENABLED:
+            return await loop.run_in_executor(
+                self.get_executor(), functools.partial(func, *args, **kwargs)
+            )
+        # Метрики воркера возвращаются вместе с результатом (в процессном пуле у него свой реестр)
+        result, observations = await loop.run_in_executor(
+            self.get_executor(), functools.partial(metrics.call_collecting, func, *args, **kwargs)
+        )
+        metrics.replay(observations)
+        return result
 
-        async with self.lock:
-            self.queue.append((future, coro_func, user_id, notify_func))
-            position = len(self.queue)
-            if notify_func and user_id:
-                await notify_func(user_id, "⏱ Немного подождите")
+    def shutdown(self, wait: bool = True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=not wait)
+            self.executor = None
 
-        await self._try_run_next()
+    def _queued_jobs(self):
+        for priority in PRIORITIES:
+            for jobs in self.waiting[priority].values():
+                yield from jobs
+
+    def queued(self, user_id=None):
+        if user_id is None:
+            return sum(1 for _ in self._queued_jobs())
+        return sum(len(self.waiting[p].get(user_id, ())) for p in PRIORITIES)
+
+    def _ahead(self, priority, seq=None):
+        """Задачи, которые (примерно) будут выполнены раньше: старшие тарифы и более ранние в своём."""
+        rank = PRIORITIES.index(priority)
+        count = chars = 0
+        for job in self._queued_jobs():
+            job_rank = PRIORITIES.index(job.priority)
+            if job_rank < rank or (job_rank == rank and (seq is None or job.seq < seq)):
+                count += 1
+                chars += job.chars
+        return count, chars
+
+    def estimate(self, chars, priority="free", seq=None):
+        """Оценка (позиция в очереди, секунд до готовности) для задачи длиной chars."""
+        count, ahead_chars = self._ahead(priority, seq)
+        seconds = (ahead_chars + self.running_chars) * self.seconds_per_char / self.max_concurrent
+        seconds += chars * self.seconds_per_char
+        position = count + 1 if count or self.running >= self.max_concurrent else 0
+        return position, seconds
+
+    def check_admission(self, user_id, chars, priority="free"):
+        """Бросает QueueRejected, если запрос лучше не ставить в очередь."""
+        if user_id is not None and self.queued(user_id) >= self.user_max_queued:
+            raise QueueRejected("user_busy", retry_after=int(chars * self.seconds_per_char) + 1)
+        _, seconds = self.estimate(chars, priority)
+        if self.max_wait_seconds and seconds > self.max_wait_seconds:
+            raise QueueRejected("overloaded", retry_after=int(seconds - self.max_wait_seconds) + 1)
+
+    async def run(self, coro_func, user_id=None, notify_func=None, chars=0, priority="free"):
+        priority = priority if priority in PRIORITIES else "free"
+        future = asyncio.get_running_loop().create_future()
+        job = TTSJob(next(self.seq), future, coro_func, user_id, notify_func, chars, priority)
+        # Анонимные задачи не связаны друг с другом — у каждой свой ключ
+        key = user_id if user_id is not None else ("job", job.seq)
+        self.waiting[priority].setdefault(key, deque()).append(job)
+        self._dispatch()
+
+        if not future.done() and notify_func and user_id:
+            position, seconds = self.estimate(chars, priority, job.seq)
+            if position:
+                await notify_func(user_id, f"⏱ Вы в очереди: {position}-й, ожидание около {int(seconds) + 1} сек.")
         return await future
 
-    async def _try_run_next(self):
-        async with self.lock:
-            if not self.queue or self.semaphore.locked():
+    def _pick_priority_order(self):
+        if self.paid_streak >= self.paid_weight and any(self.waiting["free"].values()):
+            return ("free", "paid")
+        return PRIORITIES
+
+    def _next_job(self):
+        for priority in self._pick_priority_order():
+            users = self.waiting[priority]
+            for key, jobs in users.items():
+                if key in self.active_users:
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    users.move_to_end(key)
+                else:
+                    del users[key]
+                self.paid_streak = self.paid_streak + 1 if priority == "paid" else 0
+                return key, job
+        return None, None
+
+    def _dispatch(self):
+        while self.running < self.max_concurrent:
+            key, job = self._next_job()
+            if job is None:
                 return
+            if job.future.done():
+                # Ожидающий отменил запрос, пока задача стояла в очереди
+                continue
+            metrics.QUEUE_WAIT.observe(time.monotonic() - job.enqueued, job.priority)
+            self.running += 1
+            self.running_chars += job.chars
+            self.active_users.add(key)
+            asyncio.create_task(self._execute(key, job))
 
-            future, coro_func, user_id, notify_func = self.queue.popleft()
+    async def _execute(self, key, job):
+        started = time.monotonic()
+        try:
+            result = await job.coro_func()
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if job.chars:
+                per_char = (time.monotonic() - started) / job.chars
+                self.seconds_per_char += self.EWMA_ALPHA * (per_char - self.seconds_per_char)
+        finally:
+            self.running -= 1
+            self.running_chars -= job.chars
+            self.active_users.discard(key)
+            self._dispatch()
 
-            async def task():
-                async with self.semaphore:
-                    try:
-                        result = await coro_func()
-                        future.set_result(result)
-                    except Exception as e:
-                        future.set_exception(e)
-                    finally:
-                        await self._try_run_next()
+    def stats(self):
+        return {
+            "running": self.running,
+            "queued": {p: sum(len(jobs) for jobs in self.waiting[p].values()) for p in PRIORITIES},
+            "seconds_per_char": self.seconds_per_char,
+        }
 
-            asyncio.create_task(task())
+# Глобальный экземпляр очереди (пул синтеза подключается в models/silero_tts.py).
+# С брокером задачи выполняют отдельные воркеры, а здесь ограничивается число отправленных
+tts_queue = TTSQueueManager(
+    max_concurrent=TTS_BROKER_INFLIGHT if TTS_BACKEND == "broker" else TTS_WORKERS,
+    max_wait_seconds=TTS_MAX_WAIT_SECONDS,
+    user_max_queued=TTS_USER_MAX_QUEUED,
+    paid_weight=TTS_PAID_WEIGHT,
+    seconds_per_char=SYNTH_SECONDS_PER_CHAR,
+)
 
-# Глобальный экземпляр очереди
-tts_queue = TTSQueueManager(max_concurrent=3)
\ No newline at end of file
+metrics.QUEUE_DEPTH.set_function(
+    lambda: {(p,): count for p, count in tts_queue.stats()["queued"].items()}
+)
+metrics.JOBS_IN_FLIGHT.set_function(lambda: tts_queue.running)
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+class UserLimitRecord:
+    """Компактная запись строки user_limits."""
+    __slots__ = ("used", "purchased", "cumulative", "last_request", "last_used", "registered_at", "free_limit", "frozen")
+
+    def __init__(self, used, purchased, cumulative, last_request, last_used, registered_at, free_limit, frozen):
+        self.used = used
+        self.purchased = purchased
+        self.cumulative = cumulative
+        self.last_request = last_request
+        self.last_used = last_used
+        self.registered_at = registered_at
+        self.free_limit = free_limit
+        self.frozen = frozen
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class UserCache:
+    """
+    LRU-кэш строк user_limits по user_id. Бот — единственный писатель в БД,
+    поэтому записи обновляются на месте после каждой успешной записи в БД,
+    а изменения извне сбрасываются через invalidate.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self.lock:
+            record = self.records.get(str(user_id))
+            if record is None:
+                self.misses += 1
+                return None
+            self.records.move_to_end(str(user_id))
+            self.hits += 1
+            return record
+
+    def cached(self, user_id):
+        """
+        Запись без обращения к БД или None. Промах не считается: за ним следует
+        get() в потоке БД, который его и учтёт.
+        """
+        with self.lock:
+            record = self.records.get(str(user_id))
+            if record is not None:
+                self.records.move_to_end(str(user_id))
+                self.hits += 1
+            return record
+
+    def put(self, user_id, record):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.records[str(user_id)] = record
+            self.records.move_to_end(str(user_id))
+            while len(self.records) > self.max_size:
+                self.records.popitem(last=False)
+
+    def update(self, user_id, **fields):
+        """Применяет изменения к записи, если она есть в кэше (write-through)."""
+        with self.lock:
+            record = self.records.get(str(user_id))
+            if record is None:
+                return
+            for name, value in fields.items():
+                setattr(record, name, value(getattr(record, name)) if callable(value) else value)
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.records.clear()
+            else:
+                self.records.pop(str(user_id), None)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.records),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -1,13 +1,26 @@
-import sqlite3
 from datetime import datetime
 from pathlib import Path
+from services.storage import Database
+from services.user_cache import UserCache, UserLimitRecord
+from utils.metrics import USER_CACHE_ENTRIES, USER_CACHE_HIT_RATE
+from config import USER_CACHE_SIZE
 
 DB_FILE = Path("user_limits.db")
 FREE_LIMIT = 20  # 20 бесплатных озвучек
 FLOOD_SECONDS = 5
 
+# Результаты admit_request
+ADMIT_OK = "ok"
+ADMIT_NO_QUOTA = "no_quota"
+
+db = Database(DB_FILE)
+# Кэш строк user_limits: проверки лимитов в обработчиках не ходят в БД
+user_cache = UserCache(USER_CACHE_SIZE)
+USER_CACHE_ENTRIES.set_function(lambda: cache_stats()["size"])
+USER_CACHE_HIT_RATE.set_function(lambda: cache_stats()["hit_rate"])
+
 def get_conn():
-    return sqlite3.connect(DB_FILE)
+    return db.transaction()
 
 def now_iso():
     return datetime.utcnow().isoformat()
@@ -41,12 +54,21 @@ def init_db():
         """)
         # Индекс для быстрого поиска по user_id и времени
         conn.execute("CREATE INDEX IF NOT EXISTS idx_hist_user_time ON user_limit_history (user_id, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_hist_time ON user_limit_history (timestamp)")
+        # Выбранные пользователем язык и голос
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_prefs (
+                user_id TEXT PRIMARY KEY,
+                lang TEXT,
+                speaker TEXT,
+                updated_at TEXT
+            )
+        """)
 
 def ensure_user(user_id, conn=None):
-    close_conn = False
     if conn is None:
-        conn = get_conn()
-        close_conn = True
+        with get_conn() as conn:
+            return ensure_user(user_id, conn)
     cur = conn.execute("SELECT 1 FROM user_limits WHERE user_id=?", (str(user_id),))
     if not cur.fetchone():
         now = now_iso()
@@ -54,15 +76,20 @@ def ensure_user(user_id, conn=None):
             "INSERT INTO user_limits (user_id, used, purchased, cumulative, last_request, last_used, registered_at, free_limit, frozen) VALUES (?, 0, 0, 0, NULL, NULL, ?, ?, 0)",
             (str(user_id), now, FREE_LIMIT)
         )
-    if close_conn:
-        conn.commit()
-        conn.close()
 
 def get_user_limit(user_id, conn=None):
-    close_conn = False
+    record = user_cache.get(user_id)
+    if record is not None:
+        return record.as_dict()
     if conn is None:
-        conn = get_conn()
-        close_conn = True
+        with get_conn() as conn:
+            result = _read_user_limit(user_id, conn)
+    else:
+        result = _read_user_limit(user_id, conn)
+    user_cache.put(user_id, UserLimitRecord(**result))
+    return result
+
+def _read_user_limit(user_id, conn):
     cur = conn.execute(
         """SELECT used, purchased, cumulative, last_request, last_used, registered_at, free_limit, frozen
            FROM user_limits WHERE user_id=?""",
@@ -74,27 +101,22 @@ def get_user_limit(user_id, conn=None):
         result = dict(zip(keys, row))
     else:
         ensure_user(user_id, conn)
-        result = {
-            "used": 0,
-            "purchased": 0,
-            "cumulative": 0,
-            "last_request": None,
-            "last_used": None,
-            "registered_at": now_iso(),
-            "free_limit": FREE_LIMIT,
-            "frozen": 0
-        }
-    if close_conn:
-        conn.commit()
-        conn.close()
+        result = _read_user_limit(user_id, conn)
     return result
 
-def get_left(user_id):
-    limit = get_user_limit(user_id)
+def cached_user_limit(user_id):
+    """Строка из кэша (из event loop, без БД) или None — тогда get_user_limit через run_db."""
+    record = user_cache.cached(user_id)
+    return record.as_dict() if record is not None else None
+
+def count_left(limit):
     total = limit["free_limit"] + limit["purchased"]
     left = total - limit["used"]
     return max(left, 0)
 
+def get_left(user_id):
+    return count_left(get_user_limit(user_id))
+
 def can_speak(user_id, required=1):
     limit = get_user_limit(user_id)
     if limit["frozen"]:
@@ -114,7 +136,7 @@ def add_used(user_id, amount=1, comment=None):
             "INSERT INTO user_limit_history (user_id, action, amount, timestamp, comment) VALUES (?, 'use', ?, ?, ?)",
             (str(user_id), int(amount), now, comment)
         )
-        conn.commit()
+    user_cache.update(user_id, used=lambda v: v + int(amount), cumulative=lambda v: v + int(amount), last_used=now)
 
 def add_purchased(user_id, amount, comment=None):
     now = now_iso()
@@ -128,7 +150,7 @@ def add_purchased(user_id, amount, comment=None):
             "INSERT INTO user_limit_history (user_id, action, amount, timestamp, comment) VALUES (?, 'purchase', ?, ?, ?)",
             (str(user_id), int(amount), now, comment)
         )
-        conn.commit()
+    user_cache.update(user_id, purchased=lambda v: v + int(amount))
 
 def set_last_request(user_id):
     now = now_iso()
@@ -138,7 +160,60 @@ def set_last_request(user_id):
             "UPDATE user_limits SET last_request=? WHERE user_id=?",
             (now, str(user_id))
         )
-        conn.commit()
+    user_cache.update(user_id, last_request=now)
+
+def admit_request(user_id, required=1):
+    """
+    Допуск запроса на озвучку одной транзакцией: проверка лимита и резервирование
+    озвучки (антифлуд — в services.rate_limiter, без записи в БД).
+    После ADMIT_OK резерв нужно подтвердить commit_request или вернуть
+    rollback_request при ошибке.
+    """
+    with get_conn() as conn:
+        limit = get_user_limit(user_id, conn)
+        total = limit["free_limit"] + limit["purchased"]
+        if limit["frozen"] or limit["used"] + required > total:
+            return ADMIT_NO_QUOTA
+        conn.execute(
+            "UPDATE user_limits SET used = used + ?, cumulative = cumulative + ? WHERE user_id=?",
+            (int(required), int(required), str(user_id))
+        )
+    user_cache.update(user_id, used=lambda v: v + int(required), cumulative=lambda v: v + int(required))
+    return ADMIT_OK
+
+def commit_request(user_id, amount=1, comment=None):
+    """Подтверждает озвучку, зарезервированную admit_request."""
+    now = now_iso()
+    with get_conn() as conn:
+        conn.execute("UPDATE user_limits SET last_used=? WHERE user_id=?", (now, str(user_id)))
+        conn.execute(
+            "INSERT INTO user_limit_history (user_id, action, amount, timestamp, comment) VALUES (?, 'use', ?, ?, ?)",
+            (str(user_id), int(amount), now, comment)
+        )
+    user_cache.update(user_id, last_used=now)
+
+def rollback_request(user_id, amount=1):
+    """Возвращает озвучку, зарезервированную admit_request, если синтез или отправка не удались."""
+    with get_conn() as conn:
+        conn.execute(
+            "UPDATE user_limits SET used = MAX(used - ?, 0), cumulative = MAX(cumulative - ?, 0) WHERE user_id=?",
+            (int(amount), int(amount), str(user_id))
+        )
+    user_cache.update(user_id, used=lambda v: max(v - int(amount), 0), cumulative=lambda v: max(v - int(amount), 0))
+
+def user_tier(limit):
+    """Тариф для антифлуда: "paid", если пользователь хоть раз покупал озвучки."""
+    return "paid" if limit["purchased"] > 0 else "free"
+
+def get_user_tier(user_id):
+    return user_tier(get_user_limit(user_id))
+
+def invalidate_user(user_id=None):
+    """Сбрасывает кэш пользователя (или весь кэш) после изменений в обход основных функций."""
+    user_cache.invalidate(user_id)
+
+def cache_stats():
+    return user_cache.stats()
 
 def set_frozen(user_id, state=True):
     with get_conn() as conn:
@@ -147,7 +222,7 @@ def set_frozen(user_id, state=True):
             "UPDATE user_limits SET frozen=? WHERE user_id=?",
             (1 if state else 0, str(user_id))
         )
-        conn.commit()
+    invalidate_user(user_id)
 
 def set_free_limit(user_id, free_amount):
     with get_conn() as conn:
@@ -156,7 +231,7 @@ def set_free_limit(user_id, free_amount):
             "UPDATE user_limits SET free_limit=? WHERE user_id=?",
             (int(free_amount), str(user_id))
         )
-        conn.commit()
+    invalidate_user(user_id)
 
 def log_limit_exceeded(user_id, required=1, comment=None):
     now = now_iso()
@@ -166,7 +241,6 @@ def log_limit_exceeded(user_id, required=1, comment=None):
             "INSERT INTO user_limit_history (user_id, action, amount, timestamp, comment) VALUES (?, 'limit_exceeded', ?, ?, ?)",
             (str(user_id), int(required), now, comment)
         )
-        conn.commit()
 
 def get_history(user_id, limit=20):
     with get_conn() as conn:
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from services.storage import run_db
+from services.user_limits_db import db
+from config import USER_PREFS_CACHE_SIZE, USER_PREFS_FLUSH_SECONDS
+
+class UserPrefs:
+    __slots__ = ("lang", "speaker")
+
+    def __init__(self, lang=None, speaker=None):
+        self.lang = lang
+        self.speaker = speaker
+
+class UserPrefsStore:
+    """
+    Выбранные язык и голос пользователей. Читаются из таблицы user_prefs лениво
+    и держатся в ограниченном LRU; изменения сразу видны в памяти, а в БД
+    уходят пачкой по таймеру (upsert только изменённых полей).
+    """
+
+    def __init__(self, database, max_size=50000, flush_interval=2.0):
+        self.db = database
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.cache = OrderedDict()
+        self.dirty = {}  # user_id -> {"lang": ..., "speaker": ...}, ещё не записанные в БД
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.task = None
+
+    def cached(self, user_id):
+        """Настройки из памяти или None, если их нужно прочитать из БД через get()."""
+        with self.lock:
+            prefs = self.cache.get(str(user_id))
+            if prefs is not None:
+                self.cache.move_to_end(str(user_id))
+            return prefs
+
+    def get(self, user_id):
+        prefs = self.cached(user_id)
+        if prefs is not None:
+            return prefs
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT lang, speaker FROM user_prefs WHERE user_id=?", (str(user_id),)).fetchone()
+        prefs = UserPrefs(*row) if row else UserPrefs()
+        with self.lock:
+            # Поверх прочитанного — изменения, которые ещё не записаны
+            for name, value in self.dirty.get(str(user_id), {}).items():
+                setattr(prefs, name, value)
+            self._put(str(user_id), prefs)
+        return prefs
+
+    def _put(self, key, prefs):
+        if self.max_size <= 0:
+            return
+        self.cache[key] = prefs
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def _set(self, user_id, name, value):
+        key = str(user_id)
+        with self.lock:
+            self.dirty.setdefault(key, {})[name] = value
+            prefs = self.cache.get(key)
+            # Неполную запись в кэш не кладём: остальные поля дочитает get()
+            if prefs is not None:
+                setattr(prefs, name, value)
+
+    def set_lang(self, user_id, lang):
+        self._set(user_id, "lang", lang)
+
+    def set_speaker(self, user_id, speaker):
+        self._set(user_id, "speaker", speaker)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                dirty, self.dirty = self.dirty, {}
+            if not dirty:
+                return 0
+            now = datetime.utcnow().isoformat()
+            try:
+                with self.db.transaction() as conn:
+                    conn.executemany(
+                        """INSERT INTO user_prefs (user_id, lang, speaker, updated_at) VALUES (?, ?, ?, ?)
+                           ON CONFLICT(user_id) DO UPDATE SET
+                               lang=COALESCE(excluded.lang, lang),
+                               speaker=COALESCE(excluded.speaker, speaker),
+                               updated_at=excluded.updated_at""",
+                        [(key, fields.get("lang"), fields.get("speaker"), now) for key, fields in dirty.items()]
+                    )
+            except Exception:
+                with self.lock:
+                    # Более новые изменения, сделанные во время записи, важнее
+                    for key, fields in dirty.items():
+                        self.dirty[key] = {**fields, **self.dirty.get(key, {})}
+                raise
+            return len(dirty)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await run_db(self.flush)
+            except Exception as e:
+                print("User prefs flush error:", e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await run_db(self.flush)
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.cache), "max_size": self.max_size, "dirty": len(self.dirty)}
+
+# Язык и голос пользователей (таблица user_prefs в user_limits.db)
+user_prefs = UserPrefsStore(db, max_size=USER_PREFS_CACHE_SIZE, flush_interval=USER_PREFS_FLUSH_SECONDS)
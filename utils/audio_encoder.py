@@ -0,0 +1,26 @@
+import io
+import soundfile as sf
+
+# Формат вывода -> (контейнер soundfile, подтип, расширение файла)
+FORMATS = {
+    "wav": ("WAV", "PCM_16", ".wav"),
+    "ogg": ("OGG", "OPUS", ".ogg"),
+    "flac": ("FLAC", "PCM_16", ".flac"),
+    "mp3": ("MP3", "MPEG_LAYER_III", ".mp3"),
+}
+
+# Частоты, которые умеют модели Silero v3
+SUPPORTED_SAMPLE_RATES = (8000, 24000, 48000)
+
+def file_extension(fmt):
+    return FORMATS[fmt][2]
+
+def encode_audio(audio, sample_rate, fmt="wav") -> bytes:
+    """
+    Кодирует аудио (тензор или массив float) в выбранный формат.
+    Выполняется в воркере пула синтеза, а не в event loop.
+    """
+    container, subtype, _ = FORMATS[fmt]
+    buf = io.BytesIO()
+    sf.write(buf, audio, sample_rate, format=container, subtype=subtype)
+    return buf.getvalue()
@@ -0,0 +1,158 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from aiohttp import web
+from config import METRICS_PORT
+
+# Без порта метрики выключены: observe() сразу возвращается
+ENABLED = METRICS_PORT > 0
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Наблюдения внутри воркера пула копятся здесь и возвращаются вместе с результатом
+_local = threading.local()
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # labels -> [счётчики по корзинам..., сумма, количество]
+        REGISTRY.register(self)
+
+    def observe(self, value, *labels):
+        if not ENABLED:
+            return
+        pending = getattr(_local, "pending", None)
+        if pending is not None:
+            pending.append((self.name, labels, value))
+            return
+        self.record(labels, value)
+
+    def record(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {labels: list(series) for labels, series in self.series.items()}
+        for labels, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [("le", bound)])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {series[-2]}")
+            lines.append(f"{self.name}_count{plain} {series[-1]}")
+        return lines
+
+class Gauge:
+    """Значение считается только при запросе /metrics функцией, заданной через set_function."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = None
+        REGISTRY.register(self)
+
+    def set_function(self, function):
+        # function() возвращает число, а для метрики с метками — {(метки...): число}
+        self.function = function
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.function is None:
+            return lines
+        value = self.function()
+        values = value if isinstance(value, dict) else {(): value}
+        for labels, number in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {number}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} error: {e}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def call_collecting(func, *args, **kwargs):
+    """Вызывает func в воркере и возвращает (результат, наблюдения метрик) — в процессном пуле иначе они теряются."""
+    _local.pending = []
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        pending, _local.pending = _local.pending, None
+    return result, pending
+
+def replay(observations):
+    for name, labels, value in observations:
+        REGISTRY.metrics[name].record(labels, value)
+
+QUEUE_WAIT = Histogram("tts_queue_wait_seconds", "Ожидание задачи в очереди синтеза", ["tier"])
+NORMALIZE_SECONDS = Histogram("tts_normalize_seconds", "Нормализация текста", ["lang"], (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+SYNTH_SECONDS = Histogram("tts_synthesis_seconds", "Время apply_tts", ["lang"])
+ENCODE_SECONDS = Histogram("tts_encode_seconds", "Кодирование аудио", ["format"])
+UPLOAD_SECONDS = Histogram("telegram_upload_seconds", "Отправка аудио в Telegram", ["kind"])
+DB_SECONDS = Histogram("db_call_seconds", "Вызовы БД через run_db", ["func"], (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+REALTIME_FACTOR = Histogram("tts_realtime_factor", "Время синтеза / длительность аудио", ["speaker"], (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2))
+QUEUE_DEPTH = Gauge("tts_queue_depth", "Задачи в очереди синтеза", ["tier"])
+JOBS_IN_FLIGHT = Gauge("tts_jobs_in_flight", "Выполняющиеся задачи синтеза")
+MODELS_LOADED = Gauge("tts_models_loaded", "Загруженные модели (в режиме потоков)")
+MODEL_LOAD_SECONDS = Gauge("tts_model_load_seconds", "Время последней загрузки модели языка (в режиме потоков)", ["lang"])
+MODEL_RSS_BYTES = Gauge("tts_model_rss_bytes", "Прирост резидентной памяти при загрузке модели языка (в режиме потоков)", ["lang"])
+USER_CACHE_ENTRIES = Gauge("user_limits_cache_entries", "Строки user_limits в кэше памяти")
+USER_CACHE_HIT_RATE = Gauge("user_limits_cache_hit_rate", "Доля чтений user_limits, обслуженных из кэша")
+ANALYTICS_BUFFERED = Gauge("analytics_buffered_events", "События аналитики, ожидающие записи в БД")
+ANALYTICS_DROPPED = Gauge("analytics_dropped_events", "События аналитики, отброшенные из-за переполнения буфера")
+LANGUAGE_READY = Gauge("tts_language_ready", "Язык прогрет и готов к запросам", ["lang"])
+
+async def metrics_handler(request):
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+async def start_metrics_server(host, port):
+    """Локальный HTTP-сервер с /metrics. Возвращает runner для остановки."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
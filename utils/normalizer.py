@@ -1,4 +1,6 @@
-from num2words import num2words
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from num2words import num2words, CONVERTER_CLASSES
 import re
 
 LANG_MAP = {
@@ -9,16 +11,241 @@ LANG_MAP = {
     "es": "es",
 }
 
-def normalize_numbers(text, lang='ru'):
+MONTHS = {
+    "ru": ["января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа",
+           "сентября", "октября", "ноября", "декабря"],
+    "en": ["January", "February", "March", "April", "May", "June", "July", "August",
+           "September", "October", "November", "December"],
+    "de": ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August",
+           "September", "Oktober", "November", "Dezember"],
+    "fr": ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août",
+           "septembre", "octobre", "novembre", "décembre"],
+    "es": ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+           "septiembre", "octubre", "noviembre", "diciembre"],
+}
+
+PERCENT = {
+    "ru": ("процент", "процента", "процентов"),
+    "en": "percent",
+    "de": "Prozent",
+    "fr": "pour cent",
+    "es": "por ciento",
+}
+
+CURRENCY_SIGNS = {
+    "₽": "RUB", "руб.": "RUB", "руб": "RUB", "RUB": "RUB",
+    "$": "USD", "USD": "USD",
+    "€": "EUR", "EUR": "EUR",
+}
+
+# Формы валют, которых нет в num2words для языка: (единственное, множественное)
+EXTRA_CURRENCY_FORMS = {
+    "de": {"RUB": ("Rubel", "Rubel")},
+    "fr": {"RUB": ("rouble", "roubles")},
+}
+
+ABBREVIATIONS = {
+    "ru": {"т.е.": "то есть", "т.д.": "так далее", "т.п.": "тому подобное", "т.к.": "так как",
+           "др.": "другие", "см.": "смотри", "напр.": "например", "тыс.": "тысяч",
+           "млн": "миллионов", "млрд": "миллиардов", "кг": "килограмм", "км": "километров"},
+    "en": {"Mr.": "Mister", "Mrs.": "Missis", "Dr.": "Doctor", "etc.": "et cetera",
+           "e.g.": "for example", "i.e.": "that is", "vs.": "versus", "No.": "number"},
+    "de": {"z.B.": "zum Beispiel", "usw.": "und so weiter", "bzw.": "beziehungsweise",
+           "d.h.": "das heißt", "Nr.": "Nummer", "ca.": "circa", "Dr.": "Doktor"},
+    "fr": {"M.": "Monsieur", "Mme": "Madame", "Mlle": "Mademoiselle", "etc.": "et cetera",
+           "n°": "numéro", "Dr": "Docteur"},
+    "es": {"Sr.": "Señor", "Sra.": "Señora", "Dr.": "Doctor", "etc.": "etcétera",
+           "p.ej.": "por ejemplo", "núm.": "número"},
+}
+
+# Единицы после числа: (род числительного, формы для 1 / 2–4 / 5 и больше).
+# Без числа те же сокращения читаются по ABBREVIATIONS.
+UNITS = {
+    "ru": {
+        "мм": ("m", ("миллиметр", "миллиметра", "миллиметров")),
+        "см": ("m", ("сантиметр", "сантиметра", "сантиметров")),
+        "км": ("m", ("километр", "километра", "километров")),
+        "кг": ("m", ("килограмм", "килограмма", "килограммов")),
+        "тыс.": ("f", ("тысяча", "тысячи", "тысяч")),
+        "тыс": ("f", ("тысяча", "тысячи", "тысяч")),
+        "млн": ("m", ("миллион", "миллиона", "миллионов")),
+        "млрд": ("m", ("миллиард", "миллиарда", "миллиардов")),
+    },
+}
+
+# Число начинается здесь, а не посреди "3.10.2" или "1,5,7"
+NUMBER_START = r"(?<!\d)(?<!\d[.,])"
+
+# Окончания порядковых числительных в русском: "5-й", "5-го", "90-х" -> (падеж, род, мн. число)
+RU_ORDINAL_SUFFIXES = {
+    "й": ("n", "m", False), "ый": ("n", "m", False), "ий": ("n", "m", False), "ой": ("n", "m", False),
+    "я": ("n", "f", False), "ая": ("n", "f", False), "яя": ("n", "f", False),
+    "е": ("n", "n", False), "ое": ("n", "n", False), "ее": ("n", "n", False),
+    "го": ("g", "m", False), "ого": ("g", "m", False), "его": ("g", "m", False),
+    "му": ("d", "m", False), "ому": ("d", "m", False), "ему": ("d", "m", False),
+    "м": ("p", "m", False), "ом": ("p", "m", False), "ым": ("i", "m", False), "им": ("i", "m", False),
+    "х": ("p", "m", True), "ых": ("p", "m", True), "их": ("p", "m", True),
+    "ми": ("i", "m", True), "ыми": ("i", "m", True),
+}
+
+ORDINAL_PATTERNS = {
+    "ru": r"(?P<ord_num>\d+)-(?P<ord_suffix>" + "|".join(sorted(RU_ORDINAL_SUFFIXES, key=len, reverse=True)) + r")(?!\w)",
+    "en": r"(?P<ord_num>\d+)(?P<ord_suffix>st|nd|rd|th)\b",
+    "de": r"(?P<ord_num>\d+)(?P<ord_suffix>\.)(?=\s+(?:[a-zäöüß]|" + "|".join(MONTHS["de"]) + r"))",
+    "fr": r"(?P<ord_num>\d+)(?P<ord_suffix>ère|ème|er|re|e)\b",
+    "es": r"(?P<ord_num>\d+)(?P<ord_suffix>\.?[ºª°])",
+}
+
+INTEGER = re.compile(r"\d+")
+
+@lru_cache(maxsize=8192)
+def spell(value, lang, to="cardinal", **kwargs):
+    """num2words с кэшем: одни и те же числа в трафике повторяются постоянно."""
+    number = Decimal(value) if isinstance(value, str) else value
+    return num2words(number, lang=lang, to=to, **kwargs)
+
+def _plural(lang, number, forms):
+    if isinstance(forms, str):
+        return forms
+    if lang in CONVERTER_CLASSES and len(forms) == 3:
+        return CONVERTER_CLASSES[lang].pluralize(number, forms)
+    return forms[0] if number == 1 else forms[-1]
+
+class Normalizer:
     """
-    Заменяет целые числа на текстовые эквиваленты.
-    lang: 'ru', 'en', 'de', 'fr', 'es',
+    Нормализация текста для одного языка. Все правила (даты, валюты, проценты,
+    единицы измерения, порядковые, дроби, целые, сокращения) собраны в одно скомпилированное
+    регулярное выражение, поэтому текст проходится один раз.
     """
-    def repl(match):
-        num = int(match.group(0))
+
+    def __init__(self, lang):
+        self.lang = LANG_MAP.get(lang, "ru")
+        decimal_sep = r"\." if self.lang == "en" else r"[.,]"
+        # В английском запятая — разделитель тысяч: "$1,200.50"
+        whole = r"(?:\d{1,3}(?:,\d{3})+|\d+)" if self.lang == "en" else r"\d+"
+        signs = "|".join(re.escape(s) for s in sorted(CURRENCY_SIGNS, key=len, reverse=True))
+        abbreviations = ABBREVIATIONS.get(self.lang, {})
+        rules = [
+            ("date", r"(?<!\d)(?P<date_d>\d{1,2})[./](?P<date_m>\d{1,2})[./](?P<date_y>\d{4})(?!\d)"),
+            ("money_prefix", rf"(?P<mp_sign>[$€₽])\s?(?P<mp_amount>{whole}(?:{decimal_sep}\d{{1,2}})?)(?![\d.,]\d)"),
+            ("money", rf"{NUMBER_START}(?P<m_amount>{whole}(?:{decimal_sep}\d{{1,2}})?)\s?(?P<m_sign>{signs})(?!\w)"),
+            ("percent", rf"{NUMBER_START}(?P<pct>\d+(?:{decimal_sep}\d+)?)\s?%"),
+        ]
+        self.units = UNITS.get(self.lang, {})
+        if self.units:
+            units = "|".join(re.escape(u) for u in sorted(self.units, key=len, reverse=True))
+            rules.append(("measure", rf"{NUMBER_START}(?P<qty>\d+(?:{decimal_sep}\d+)?)\s?(?P<unit>{units})(?!\w)"))
+        rules += [
+            ("ordinal", ORDINAL_PATTERNS[self.lang]),
+            # Дробь — только если всё число вида 1,5 / 2.75, а не часть "3.10.2"
+            ("decimal", rf"{NUMBER_START}(?P<dec>{whole}{decimal_sep}\d+)(?![.,]?\d)"),
+            ("integer", whole),
+        ]
+        if abbreviations:
+            words = "|".join(re.escape(a) for a in sorted(abbreviations, key=len, reverse=True))
+            rules.append(("abbr", rf"(?<!\w)(?:{words})(?!\w)"))
+        self.abbreviations = abbreviations
+        self.pattern = re.compile("|".join(f"(?P<{name}>{regex})" for name, regex in rules))
+        self.handlers = {name: getattr(self, f"_{name}") for name, _ in rules}
+
+    def normalize(self, text):
+        return self.pattern.sub(self._dispatch, text)
+
+    def _dispatch(self, match):
+        try:
+            return self.handlers[match.lastgroup](match)
+        except (NotImplementedError, InvalidOperation, OverflowError, ValueError, KeyError):
+            # Не смогли прочитать конструкцию целиком — хотя бы числа по отдельности
+            return INTEGER.sub(lambda m: self._number(m.group(0)), match.group(0))
+
+    def _to_decimal(self, raw):
+        return raw.replace(",", "") if self.lang == "en" else raw.replace(",", ".")
+
+    def _number(self, raw):
         try:
-            nlang = LANG_MAP.get(lang, "ru")
-            return num2words(num, lang=nlang)
+            return spell(int(raw.replace(",", "")), self.lang)
         except Exception:
-            return match.group(0)
-    return re.sub(r'\d+', repl, text)
\ No newline at end of file
+            return raw
+
+    def _integer(self, match):
+        return self._number(match.group(0))
+
+    def _decimal(self, match):
+        return spell(self._to_decimal(match.group("dec")), self.lang)
+
+    def _percent(self, match):
+        raw = self._to_decimal(match.group("pct"))
+        number = Decimal(raw)
+        words = spell(raw, self.lang)
+        if number == number.to_integral_value():
+            return f"{words} {_plural(self.lang, int(number), PERCENT[self.lang])}"
+        forms = PERCENT[self.lang]
+        return f"{words} {forms[1] if isinstance(forms, tuple) else forms}"
+
+    def _measure(self, match):
+        gender, forms = self.units[match.group("unit")]
+        raw = self._to_decimal(match.group("qty"))
+        number = Decimal(raw)
+        if number != number.to_integral_value():
+            # "1,5 км" — "одна целая пять десятых километра"
+            return f"{spell(raw, self.lang)} {forms[1]}"
+        return f"{spell(int(number), self.lang, gender=gender)} {_plural(self.lang, int(number), forms)}"
+
+    def _money(self, match, amount=None, sign=None):
+        amount = self._to_decimal(amount or match.group("m_amount"))
+        code = CURRENCY_SIGNS[sign or match.group("m_sign")]
+        number = Decimal(amount)
+        extra = EXTRA_CURRENCY_FORMS.get(self.lang, {}).get(code)
+        converter = CONVERTER_CLASSES[self.lang]
+        if number == number.to_integral_value():
+            forms = extra or converter.CURRENCY_FORMS[code][0]
+            return f"{spell(int(number), self.lang)} {_plural(self.lang, int(number), forms)}"
+        if extra:
+            return f"{spell(amount, self.lang)} {extra[1]}"
+        return spell(amount, self.lang, to="currency", currency=code)
+
+    def _money_prefix(self, match):
+        return self._money(match, amount=match.group("mp_amount"), sign=match.group("mp_sign"))
+
+    def _ordinal(self, match):
+        number = int(match.group("ord_num"))
+        suffix = match.group("ord_suffix")
+        if self.lang == "ru":
+            case, gender, plural = RU_ORDINAL_SUFFIXES[suffix]
+            return spell(number, "ru", to="ordinal", case=case, gender=gender, plural=plural)
+        words = spell(number, self.lang, to="ordinal")
+        if self.lang == "es" and suffix.endswith("ª") and words.endswith("o"):
+            words = words[:-1] + "a"
+        return words
+
+    def _date(self, match):
+        day, month, year = int(match.group("date_d")), int(match.group("date_m")), int(match.group("date_y"))
+        if not (1 <= day <= 31 and 1 <= month <= 12):
+            raise ValueError("not a date")
+        month_name = MONTHS[self.lang][month - 1]
+        if self.lang == "ru":
+            return (f"{spell(day, 'ru', to='ordinal', gender='n')} {month_name} "
+                    f"{spell(year, 'ru', to='ordinal', case='g')} года")
+        if self.lang == "en":
+            return f"{month_name} {spell(day, 'en', to='ordinal')}, {spell(year, 'en', to='year')}"
+        if self.lang == "de":
+            return f"{spell(day, 'de', to='ordinal')} {month_name} {spell(year, 'de', to='year')}"
+        if self.lang == "fr":
+            day_words = "premier" if day == 1 else spell(day, "fr")
+            return f"{day_words} {month_name} {spell(year, 'fr', to='year')}"
+        return f"{spell(day, 'es')} de {month_name} de {spell(year, 'es', to='year')}"
+
+    def _abbr(self, match):
+        return self.abbreviations[match.group(0)]
+
+@lru_cache(maxsize=None)
+def get_normalizer(lang):
+    return Normalizer(lang)
+
+def normalize_numbers(text, lang='ru'):
+    """
+    Приводит текст к словам для синтеза: даты, суммы, проценты, порядковые,
+    дробные и целые числа, распространённые сокращения.
+    lang: 'ru', 'en', 'de', 'fr', 'es',
+    """
+    return get_normalizer(lang).normalize(text)
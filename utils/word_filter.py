@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+def load_blocked_words(path: str = "blocked_words.txt") -> set:
+    file = Path(path)
+    if not file.exists():
+        return set()
+    return set(
+        line.strip().lower()
+        for line in file.read_text(encoding="utf-8").splitlines()
+        if line.strip() and not line.startswith("#")
+    )
+
+class AhoCorasick:
+    """Автомат Ахо–Корасик: все вхождения всех шаблонов за один проход по тексту."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern):
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = nxt
+        self.output[state] = self.output[state] + (pattern,)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                fallback = self.goto[f].get(ch, 0)
+                self.fail[nxt] = fallback if fallback != nxt else 0
+                # Совпадения суффиксов сразу копируются в выход состояния
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find_all(self, text):
+        """Возвращает список (позиция начала, шаблон) для всех вхождений."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        found = []
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.extend((i - len(p) + 1, p) for p in output[state])
+        return found
+
+class BlockedWordsMatcher:
+    """
+    Фильтр запрещённых слов на автомате Ахо–Корасик. Список перечитывается,
+    когда меняется mtime файла (проверка не чаще раза в check_interval секунд).
+    whole_words=True — совпадение только целым словом, иначе подстрокой.
+    """
+
+    def __init__(self, path="blocked_words.txt", whole_words=False, check_interval=5.0):
+        self.path = path
+        self.whole_words = whole_words
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.checked_at = 0.0
+        self.reloading = False
+        self.automaton = AhoCorasick(())
+        self._reload_if_changed(force=True)
+
+    def _reload_if_changed(self, force=False):
+        now = time.monotonic()
+        if not force and (self.reloading or now - self.checked_at < self.check_interval):
+            return
+        self.checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.mtime and not force:
+            return
+        if force:
+            self._rebuild(mtime)
+            return
+        # Сборка автомата на тысячах слов занимает ~0.1 с: она идёт в отдельном потоке,
+        # а до замены проверки выполняет прежний автомат
+        self.reloading = True
+        threading.Thread(target=self._rebuild, args=(mtime,), name="blocked-words", daemon=True).start()
+
+    def _rebuild(self, mtime):
+        try:
+            automaton = AhoCorasick(load_blocked_words(self.path))
+            with self.lock:
+                self.automaton = automaton
+                self.mtime = mtime
+        except (OSError, UnicodeDecodeError) as e:
+            # mtime не обновлён — попытка повторится при следующей проверке
+            print("Blocked words reload error:", e)
+        finally:
+            self.reloading = False
+
+    def _is_word(self, text, start, end):
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+        return not before.isalnum() and not after.isalnum()
+
+    def find_all(self, text):
+        """Все запрещённые слова, найденные в тексте (без повторов, в порядке появления)."""
+        self._reload_if_changed()
+        lower_text = text.lower()
+        found = []
+        for start, word in self.automaton.find_all(lower_text):
+            if self.whole_words and not self._is_word(lower_text, start, start + len(word)):
+                continue
+            if word not in found:
+                found.append(word)
+        return found
@@ -0,0 +1,106 @@
+"""
+Воркер синтеза для режима TTS_BACKEND=broker: забирает задачи из брокера,
+синтезирует и возвращает аудио боту. Воркеров может быть сколько угодно.
+
+    python worker.py                      # один воркер, языки из MODEL_PRELOAD
+    python worker.py --processes 4        # четыре процесса
+    python worker.py --langs ru,en        # только задачи этих языков
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import time
+import torch
+from config import MODEL_PRELOAD, TTS_TORCH_THREADS
+from models.silero_tts import registry, synthesize_full, ensure_warm
+from services.job_broker import job_broker
+
+IDLE_SLEEP_MAX = 0.5
+
+def run_worker(langs=None):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    torch.set_num_threads(TTS_TORCH_THREADS)
+    job_broker.init()
+    registry.preload(langs or MODEL_PRELOAD)
+    for lang in langs or MODEL_PRELOAD:
+        print(f"Язык '{lang}' прогрет за {ensure_warm(lang):.1f} с.")
+    print(f"Воркер {worker_id} готов (языки: {', '.join(langs) if langs else 'все'})")
+
+    stopping = False
+
+    def request_stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    idle_sleep = 0.01
+    last_requeue = 0.0
+    while not stopping:
+        try:
+            if time.monotonic() - last_requeue > job_broker.job_timeout / 4:
+                last_requeue = time.monotonic()
+                job_broker.requeue_expired()
+            job = job_broker.claim(worker_id, langs)
+        except sqlite3.OperationalError as e:
+            # "database is locked" при нагрузке от бота и других воркеров: пауза и новая попытка
+            print(f"Воркер {worker_id}: ошибка БД брокера: {e}")
+            time.sleep(idle_sleep)
+            idle_sleep = min(idle_sleep * 2, IDLE_SLEEP_MAX)
+            continue
+        if job is None:
+            # Пустая очередь: опрашиваем всё реже, чтобы не грузить БД
+            time.sleep(idle_sleep)
+            idle_sleep = min(idle_sleep * 2, IDLE_SLEEP_MAX)
+            continue
+        idle_sleep = 0.01
+        job_id, speaker, text = job
+        try:
+            result = synthesize_full(text, speaker)
+        except Exception as e:
+            print(f"Задача {job_id}: ошибка синтеза: {e}")
+            try:
+                job_broker.fail(job_id, worker_id, e)
+            except sqlite3.OperationalError as db_error:
+                # Аренда истечёт, и задачу вернёт в очередь requeue_expired
+                print(f"Задача {job_id}: ошибка БД брокера: {db_error}")
+            continue
+        try:
+            accepted = job_broker.complete(job_id, worker_id, data=result.data, path=result.path, filename=result.filename)
+        except sqlite3.OperationalError as e:
+            print(f"Задача {job_id}: ошибка БД брокера: {e}")
+            accepted = False
+        if not accepted and result.path:
+            # Задачу отменили или отдали другому воркеру — сброшенный на диск результат никто не заберёт
+            try:
+                os.remove(result.path)
+            except FileNotFoundError:
+                pass
+    job_broker.db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Воркер синтеза речи для брокера задач")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--langs", default="", help="языки через запятую (по умолчанию — любые задачи)")
+    args = parser.parse_args()
+    langs = [l for l in args.langs.split(",") if l] or None
+
+    if args.processes <= 1:
+        run_worker(langs)
+        return
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=run_worker, args=(langs,)) for _ in range(args.processes)]
+    # Ctrl+C получают все процессы группы сами; SIGTERM передаём воркерам — они доделают текущую задачу
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in processes])
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()